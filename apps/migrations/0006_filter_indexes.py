@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0005_created_at_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='app',
+            index=models.Index(fields=['user', 'type'], name='app_user_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='app',
+            index=models.Index(fields=['user', 'framework'], name='app_user_framework_idx'),
+        ),
+    ]
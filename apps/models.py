@@ -33,5 +33,12 @@ class App(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='app_user_created_id_idx'),
+            models.Index(fields=['user', 'type'], name='app_user_type_idx'),
+            models.Index(fields=['user', 'framework'], name='app_user_framework_idx'),
+        ]
+
     def __str__(self):
         return self.name
\ No newline at end of file
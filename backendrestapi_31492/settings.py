@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
+import tempfile
 import environ
 import logging
+from django.core.exceptions import ImproperlyConfigured
 from modules.manifest import get_modules
 
 env = environ.Env()
@@ -49,7 +52,7 @@ INSTALLED_APPS = [
     'django.contrib.sites',
 ]
 LOCAL_APPS = [
-    'home',
+    'home.apps.HomeConfig',
     'users.apps.UsersConfig',
     'apps',
     'subscriptions'
@@ -68,12 +71,35 @@ THIRD_PARTY_APPS = [
     'drf_yasg',
     'storages',
 ]
-MODULES_APPS = get_modules()
+# Without DEBUG, installed modules are read from modules/manifest.json, written
+# by `manage.py build_module_manifest`; MODULES_SCAN=1 scans modules/ instead
+MODULES_SCAN = env.bool("MODULES_SCAN", DEBUG)
+MODULES_APPS = get_modules(scan=MODULES_SCAN)
 
 INSTALLED_APPS += LOCAL_APPS + THIRD_PARTY_APPS + MODULES_APPS
 
+# "full" runs everything. "api" is for API-only worker nodes: it leaves out the
+# admin, API docs, dev tools, the Google login provider and storages, so workers
+# start faster and use less memory (compare with `manage.py import_profile`).
+# Run migrations and collectstatic with the full profile.
+SETTINGS_PROFILE = env.str("SETTINGS_PROFILE", "full")
+API_PROFILE_EXCLUDED_APPS = [
+    'django.contrib.admin',
+    'allauth.socialaccount.providers.google',
+    'django_extensions',
+    'drf_yasg',
+    'storages',
+]
+if SETTINGS_PROFILE not in ("full", "api"):
+    raise ImproperlyConfigured(f"Unknown SETTINGS_PROFILE {SETTINGS_PROFILE!r}, expected 'full' or 'api'")
+if SETTINGS_PROFILE == "api":
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_PROFILE_EXCLUDED_APPS]
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'home.middleware.RequestMetricsMiddleware',
+    'home.middleware.SlowQueryViewMiddleware',
+    'home.middleware.APICompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -118,6 +144,22 @@ if env.str("DATABASE_URL", default=None):
         'default': env.db()
     }
 
+# Per-process connection pool (home.db.pool). Connections are checked in at the
+# end of each request instead of being closed, so keep CONN_MAX_AGE at 0.
+DB_POOL = env.bool("DB_POOL", False)
+# Should be at least the number of request threads (waitress --threads, 4 by default)
+DB_POOL_MAX_SIZE = env.int("DB_POOL_MAX_SIZE", 10)
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = env.float("DB_POOL_TIMEOUT", 5)
+DB_POOL_MAX_LIFETIME = env.int("DB_POOL_MAX_LIFETIME", 1800)
+# Connections idle for longer are checked with SELECT 1 before reuse
+DB_POOL_CHECK_AFTER = env.int("DB_POOL_CHECK_AFTER", 5)
+if DB_POOL:
+    from home.db.backends import POOLED_ENGINES
+
+    for database in DATABASES.values():
+        database['ENGINE'] = POOLED_ENGINES.get(database['ENGINE'], database['ENGINE'])
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -192,8 +234,98 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    # JSON goes through orjson when it is installed; MessagePack is offered
+    # (Accept / Content-Type: application/msgpack) when msgpack is installed.
+    'DEFAULT_RENDERER_CLASSES': [
+        'home.api.v1.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'home.api.v1.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+if importlib.util.find_spec("msgpack"):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'home.api.v1.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'home.api.v1.renderers.MessagePackParser')
+
+# Cache backend from CACHE_URL, e.g. locmemcache://, filecache:///var/tmp/django_cache
+# or redis://redis:6379/1 (the Redis backend needs the django-redis package)
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
 }
+# Backends whose entries other server processes can't see
+PROCESS_LOCAL_CACHES = [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
+# Keyset pagination for /api/v1/apps and /api/v1/subscriptions
+API_PAGE_SIZE = env.int("API_PAGE_SIZE", 100)
+API_MAX_PAGE_SIZE = env.int("API_MAX_PAGE_SIZE", 1000)
+# Rows per database round trip / bulk_create for NDJSON export and import
+NDJSON_CHUNK_SIZE = env.int("NDJSON_CHUNK_SIZE", 1000)
+
+# Per-user cached GET responses for /api/v1/apps and /api/v1/subscriptions (0 disables).
+# Writes invalidate them through version counters in the default cache, so they
+# are only on by default when that cache is shared between processes.
+API_RESPONSE_CACHE_TTL = env.int(
+    "API_RESPONSE_CACHE_TTL", 0 if CACHES["default"]["BACKEND"] in PROCESS_LOCAL_CACHES else 300
+)
+# Expired entries are kept this much longer and served while one request refreshes them
+API_RESPONSE_CACHE_STALE_TTL = env.int("API_RESPONSE_CACHE_STALE_TTL", 60)
+
+# Single-flight cache refills (home.api.v1.singleflight): how long a request
+# waits for another one computing the same entry, and the cross-process lock TTL
+SINGLEFLIGHT_WAIT_TIMEOUT = env.int("SINGLEFLIGHT_WAIT_TIMEOUT", 10)
+SINGLEFLIGHT_LOCK_TIMEOUT = env.int("SINGLEFLIGHT_LOCK_TIMEOUT", 30)
+
+# gzip / brotli compression of API responses (home.middleware)
+API_COMPRESSION_PREFIXES = env.list("API_COMPRESSION_PREFIXES", default=["/api/"])
+# Smaller bodies are sent as is
+API_COMPRESSION_MIN_SIZE = env.int("API_COMPRESSION_MIN_SIZE", 1024)
+API_COMPRESSION_GZIP_LEVEL = env.int("API_COMPRESSION_GZIP_LEVEL", 6)
+API_COMPRESSION_BROTLI_QUALITY = env.int("API_COMPRESSION_BROTLI_QUALITY", 4)
+# Streaming responses are flushed to the client after this many input bytes
+API_COMPRESSION_STREAM_FLUSH = env.int("API_COMPRESSION_STREAM_FLUSH", 16384)
+
+# Per-request metrics (home.metrics): histograms served at /metrics and a
+# Server-Timing header on responses under METRICS_PREFIXES
+METRICS_PREFIXES = env.list("METRICS_PREFIXES", default=["/api/"])
+# Server-Timing exposes query counts and timings to every client: DEBUG only by default
+METRICS_SERVER_TIMING = env.bool("METRICS_SERVER_TIMING", DEBUG)
+# Directory shared by all worker processes to aggregate metrics across them
+# (empty: /metrics reports the serving process only)
+METRICS_DIR = env.str("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", 5)
+# If set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = env.str("METRICS_TOKEN", "")
+
+# Slow query log (home.db.slow_queries, manage.py slow_queries): statements
+# taking at least this long are appended to SLOW_QUERY_LOG (0: off), which
+# must be writable by the server process (the image runs it as `django`)
+SLOW_QUERY_THRESHOLD_MS = env.float("SLOW_QUERY_THRESHOLD_MS", 0)
+SLOW_QUERY_LOG = env.str("SLOW_QUERY_LOG", os.path.join(tempfile.gettempdir(), "slow_queries.log"))
+# Each statement fingerprint is EXPLAINed at most once per interval and process
+SLOW_QUERY_EXPLAIN_INTERVAL = env.float("SLOW_QUERY_EXPLAIN_INTERVAL", 300)
+# PostgreSQL: EXPLAIN (ANALYZE, BUFFERS) slow SELECTs, running them a second time
+SLOW_QUERY_EXPLAIN_ANALYZE = env.bool("SLOW_QUERY_EXPLAIN_ANALYZE", False)
+
+# Cache-Control max-age for /api/v1/plans responses
+PLAN_CATALOG_MAX_AGE = env.int("PLAN_CATALOG_MAX_AGE", 300)
+# Seconds a process serves its pre-rendered plans before rebuilding them, which
+# bounds staleness when the cache holding the catalog version isn't shared
+PLAN_CATALOG_TTL = env.int("PLAN_CATALOG_TTL", 60)
+
+# Database-backed task queue (home.tasks, manage.py runworker)
+TASK_MAX_ATTEMPTS = env.int("TASK_MAX_ATTEMPTS", 5)
+# Retry n waits TASK_RETRY_BACKOFF * 2 ** (n - 1) seconds, capped at the max
+TASK_RETRY_BACKOFF = env.int("TASK_RETRY_BACKOFF", 10)
+TASK_RETRY_BACKOFF_MAX = env.int("TASK_RETRY_BACKOFF_MAX", 3600)
+# Running tasks not finished after this long are assumed lost and reclaimed
+TASK_VISIBILITY_TIMEOUT = env.int("TASK_VISIBILITY_TIMEOUT", 600)
 
 # Custom user model
 AUTH_USER_MODEL = "users.User"
@@ -206,6 +338,17 @@ EMAIL_HOST_USER = 'test.kramsn@gmail.com'
 EMAIL_HOST_PASSWORD = 'Test@Pass123$'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
+# Mail is written to the home.OutboxMessage table and sent by runworker
+EMAIL_BACKEND = env.str("EMAIL_BACKEND", "home.mail.OutboxEmailBackend")
+OUTBOX_DELIVERY_BACKEND = env.str("OUTBOX_DELIVERY_BACKEND", "home.smtp.PooledSMTPEmailBackend")
+OUTBOX_BATCH_SIZE = env.int("OUTBOX_BATCH_SIZE", 100)
+OUTBOX_MAX_ATTEMPTS = env.int("OUTBOX_MAX_ATTEMPTS", 5)
+# Persistent SMTP connections kept by home.smtp.PooledSMTPEmailBackend
+EMAIL_POOL_MAX_IDLE = env.int("EMAIL_POOL_MAX_IDLE", 4)
+EMAIL_POOL_IDLE_TIMEOUT = env.int("EMAIL_POOL_IDLE_TIMEOUT", 300)
+# Idle connections older than this are checked with NOOP before reuse
+EMAIL_POOL_NOOP_AFTER = env.int("EMAIL_POOL_NOOP_AFTER", 30)
+EMAIL_POOL_MAX_MESSAGES = env.int("EMAIL_POOL_MAX_MESSAGES", 100)
 
 
 # AWS S3 config
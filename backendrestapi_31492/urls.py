@@ -14,20 +14,17 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include, re_path
 from django.views.generic.base import TemplateView
 from allauth.account.views import confirm_email
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
 urlpatterns = [
     path("", include("home.urls")),
     path("accounts/", include("allauth.urls")),
     path("modules/", include("modules.urls")),
     path("api/v1/", include("home.api.v1.urls")),
-    path("admin/", admin.site.urls),
     path("users/", include("users.urls", namespace="users")),
     path("rest-auth/", include("rest_auth.urls")),
     # Override email confirm to use allauth's HTML view instead of rest_auth's API view
@@ -35,24 +32,35 @@ urlpatterns = [
     path("rest-auth/registration/", include("rest_auth.registration.urls")),
 ]
 
-admin.site.site_header = "BackendRestAPI"
-admin.site.site_title = "BackendRestAPI Admin Portal"
-admin.site.index_title = "BackendRestAPI Admin"
-
-# swagger
-api_info = openapi.Info(
-    title="BackendRestAPI API",
-    default_version="v1",
-    description="API documentation for BackendRestAPI App",
-)
-
-schema_view = get_schema_view(
-    api_info,
-    public=True,
-    permission_classes=(permissions.IsAuthenticated,),
-)
-
-urlpatterns += [
-    path("api-docs/", schema_view.with_ui("swagger", cache_timeout=0), name="api_docs")
-]
+# The admin and the API docs are left out by SETTINGS_PROFILE=api.
+if apps.is_installed("django.contrib.admin"):
+    from django.contrib import admin
+
+    urlpatterns += [
+        path("admin/", admin.site.urls),
+    ]
+
+    admin.site.site_header = "BackendRestAPI"
+    admin.site.site_title = "BackendRestAPI Admin Portal"
+    admin.site.index_title = "BackendRestAPI Admin"
+
+if apps.is_installed("drf_yasg"):
+    from drf_yasg.views import get_schema_view
+    from drf_yasg import openapi
+
+    # swagger
+    api_info = openapi.Info(
+        title="BackendRestAPI API",
+        default_version="v1",
+        description="API documentation for BackendRestAPI App",
+    )
+
+    schema_view = get_schema_view(
+        api_info,
+        public=True,
+        permission_classes=(permissions.IsAuthenticated,),
+    )
 
+    urlpatterns += [
+        path("api-docs/", schema_view.with_ui("swagger", cache_timeout=0), name="api_docs")
+    ]
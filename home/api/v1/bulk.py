@@ -0,0 +1,183 @@
+from django.db import transaction
+from django.utils import timezone
+
+from home.api.v1.ownership import app_ownership
+from home.api.v1.response_cache import response_cache
+from home.api.v1.ndjson import load_lines
+from home.api.v1.serializers import AppImportSerializer, BulkSubscriptionSerializer
+from apps.models import App
+from subscriptions.models import Plan, Subscription
+
+
+class BulkError(Exception):
+    """Raised with a list of per-item error dicts, aligned with the input."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def bulk_upsert_subscriptions(user_id, items):
+    """
+    Create (no `id`) or update (with `id`) many subscriptions of one user.
+
+    Ownership, foreign keys and the UserAppPlan constraint are checked for the
+    whole batch with a fixed number of queries, then everything is written
+    with bulk_create / bulk_update in a single transaction. Nothing is written
+    if any item fails; the raised BulkError lists the problems per item.
+    """
+    errors, rows = [], []
+    for item in items:
+        serializer = BulkSubscriptionSerializer(data=item)
+        if serializer.is_valid():
+            errors.append({})
+            rows.append(serializer.validated_data)
+        else:
+            errors.append(dict(serializer.errors))
+            rows.append(None)
+
+    def fail(index, field, message):
+        errors[index].setdefault(field, []).append(message)
+
+    for index, row in enumerate(rows):
+        if row is not None and row['user'] != user_id:
+            fail(index, 'user', 'Operation not allowed for this user')
+
+    valid = [(i, row) for i, row in enumerate(rows) if row is not None]
+    app_ids = {row['app'] for _, row in valid if 'app' in row}
+    plan_ids = {row['plan'] for _, row in valid if 'plan' in row}
+    update_ids = {row['id'] for _, row in valid if 'id' in row}
+
+    with transaction.atomic():
+        owned_apps = app_ownership.owned_among(user_id, app_ids)
+        known_plans = set(Plan.objects.filter(id__in=plan_ids).values_list('id', flat=True))
+        existing = Subscription.objects.select_for_update().filter(
+            user=user_id, id__in=update_ids).in_bulk()
+        app_taken_by = dict(
+            Subscription.objects.filter(user=user_id, app__in=app_ids).values_list('app', 'id')
+        )
+
+        to_create, to_update, results = [], [], {}
+        claimed = {}
+        for index, row in valid:
+            if 'app' in row and row['app'] not in owned_apps:
+                fail(index, 'app', 'Improper app for the user')
+            if 'plan' in row and row['plan'] not in known_plans:
+                fail(index, 'plan', 'Invalid plan')
+
+            if 'id' in row:
+                sub = existing.get(row['id'])
+                if sub is None:
+                    fail(index, 'id', 'Not found')
+                    continue
+            else:
+                sub = Subscription(user_id=user_id)
+
+            app_id = row.get('app', sub.app_id)
+            if sub.pk is not None and app_id != sub.app_id:
+                # Updates are written first, so the app it moves away from is
+                # free for the rest of the batch.
+                for taken in (claimed, app_taken_by):
+                    if taken.get(sub.app_id) == sub.pk:
+                        del taken[sub.app_id]
+            if app_id is not None:
+                holder = claimed.get(app_id, app_taken_by.get(app_id))
+                if holder is not None and holder != sub.pk:
+                    fail(index, 'app', 'A subscription for this app already exists')
+                claimed[app_id] = sub.pk if sub.pk is not None else -index - 1
+
+            if errors[index]:
+                continue
+            for field in ('plan', 'app'):
+                if field in row:
+                    setattr(sub, f'{field}_id', row[field])
+            if 'active' in row:
+                sub.active = row['active']
+            (to_update if sub.pk else to_create).append(sub)
+            results[index] = sub
+
+        if any(errors):
+            raise BulkError(errors)
+
+        now = timezone.now()
+        for sub in to_update:
+            sub.updated_at = now
+        Subscription.objects.bulk_update(to_update, ['plan', 'app', 'active', 'updated_at'])
+        Subscription.objects.bulk_create(to_create)
+        # bulk_create / bulk_update skip post_save.
+        response_cache.bump(user_id)
+
+        # Not every backend returns ids from bulk_create; (user, app) is unique.
+        missing = {sub.app_id: sub for sub in to_create if sub.pk is None}
+        if missing:
+            ids = Subscription.objects.filter(user=user_id, app__in=missing).values_list('app', 'id')
+            for app_id, pk in ids:
+                missing[app_id].pk = pk
+
+    return [results[index] for index in range(len(items))], len(to_create), len(to_update)
+
+
+def import_apps(user_id, stream, chunk_size, max_errors=100):
+    """
+    Import NDJSON app rows from `stream` into `user_id`'s account.
+
+    Lines are parsed and validated as they are read and inserted with
+    bulk_create every `chunk_size` rows, so memory does not grow with the
+    input. Everything runs in one transaction, which is rolled back if any
+    line fails; returns `(created, errors)`.
+    """
+    created, errors, chunk = 0, [], []
+
+    def flush():
+        names = [app.name for _, app in chunk]
+        taken = set(App.objects.filter(name__in=names).values_list('name', flat=True))
+        seen = set()
+        for line_number, app in chunk:
+            if app.name in taken or app.name in seen:
+                errors.append({'line': line_number, 'errors': {'name': ['app with this name already exists.']}})
+            seen.add(app.name)
+        if not errors:
+            App.objects.bulk_create([app for _, app in chunk])
+        chunk.clear()
+
+    with transaction.atomic():
+        for line_number, obj, error in load_lines(stream):
+            if error is not None:
+                errors.append({'line': line_number, 'errors': {'non_field_errors': [error]}})
+            else:
+                serializer = AppImportSerializer(data=obj)
+                if serializer.is_valid():
+                    chunk.append((line_number, App(user_id=user_id, **serializer.validated_data)))
+                    created += 1
+                else:
+                    errors.append({'line': line_number, 'errors': serializer.errors})
+            if len(chunk) >= chunk_size:
+                flush()
+            if len(errors) >= max_errors:
+                break
+        if chunk and len(errors) < max_errors:
+            flush()
+
+        if errors:
+            transaction.set_rollback(True)
+            return 0, errors[:max_errors]
+        response_cache.bump(user_id)
+    return created, []
+
+
+def delete_apps(user_id, app_ids):
+    """
+    Delete `user_id`'s apps among `app_ids`, deactivating their subscriptions.
+
+    The subscriptions are deactivated (and detached, as the SET_NULL cascade
+    would) by one set-based UPDATE in the same transaction as the delete, so
+    the statement count does not depend on how many rows are affected.
+    Returns the number of apps deleted.
+    """
+    with transaction.atomic():
+        apps = App.objects.filter(user=user_id, id__in=app_ids)
+        Subscription.objects.filter(user=user_id, app__in=apps).update(
+            active=False, app=None, updated_at=timezone.now())
+        _, deleted = apps.delete()
+        response_cache.bump(user_id)
+    return deleted.get(App._meta.label, 0)
@@ -0,0 +1,59 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGet:
+    """
+    ETag / Last-Modified validators for a read queryset.
+
+    Validators come from one aggregate query (row count plus the latest
+    `updated_at`, including that of any expanded relations), so a 304 can be
+    returned before any row is fetched or serialized. The ETag also covers the
+    request path, query string and Accept header, because those shape the body.
+
+    Collections only get the ETag: deleting a row does not move the latest
+    `updated_at`, so Last-Modified would let If-Modified-Since keep answering
+    304 for a list that lost rows. The ETag covers that through the count.
+    """
+
+    def __init__(self, request, queryset, relations=(), collection=False):
+        aggregates = {'count': Count('pk'), 'last_modified': Max('updated_at')}
+        for name in relations:
+            aggregates[name] = Max(f'{name}__updated_at')
+        values = queryset.order_by().aggregate(**aggregates)
+
+        timestamps = [values['last_modified']] + [values[name] for name in relations]
+        timestamps = [t for t in timestamps if t is not None]
+        self.last_modified = max(timestamps) if timestamps and not collection else None
+
+        parts = [
+            queryset.model._meta.label,
+            str(getattr(request.user, 'pk', '')),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            str(values['count']),
+        ] + [t.isoformat() for t in timestamps]
+        self.etag = quote_etag(hashlib.sha1('|'.join(parts).encode()).hexdigest())
+
+    @classmethod
+    def supports(cls, model, relations=()):
+        """Validators are only sound when every included model tracks updated_at."""
+        models = [model] + [model._meta.get_field(name).related_model for name in relations]
+        return all(any(f.name == 'updated_at' for f in m._meta.get_fields()) for m in models)
+
+    def not_modified(self, request):
+        """Return a 304 response if the client's copy is current, else None."""
+        last_modified = int(self.last_modified.timestamp()) if self.last_modified else None
+        response = get_conditional_response(
+            getattr(request, '_request', request), etag=self.etag, last_modified=last_modified
+        )
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified.timestamp())
+        return response
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ParseError
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def parse_bool(value):
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(value)
+
+
+def parse_timestamp(value):
+    parsed = parse_datetime(value) or parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+def parse_ids(value):
+    ids = [int(i) for i in value.split(',') if i.strip()]
+    if not ids or len(ids) > settings.API_MAX_PAGE_SIZE:
+        raise ValueError(value)
+    return ids
+
+
+class QueryFilter:
+    """
+    Whitelisted `?param=value` filters mapped onto ORM lookups.
+
+    `filters` maps a query parameter to `(lookup, parser)`; parameters that are
+    not listed are ignored and values that do not parse are rejected with 400.
+    """
+
+    def __init__(self, **filters):
+        self.filters = filters
+
+    def filter_queryset(self, request, queryset):
+        lookups = {}
+        for param, (lookup, parser) in self.filters.items():
+            if param not in request.query_params:
+                continue
+            try:
+                lookups[lookup] = parser(request.query_params[param])
+            except (TypeError, ValueError):
+                raise ParseError(f'Invalid value for {param}')
+        return queryset.filter(**lookups)
+
+
+COMMON_FILTERS = {
+    'ids': ('id__in', parse_ids),
+    'created_after': ('created_at__gte', parse_timestamp),
+    'created_before': ('created_at__lt', parse_timestamp),
+}
+
+app_filter = QueryFilter(
+    type=('type', str),
+    framework=('framework', str),
+    **COMMON_FILTERS
+)
+
+subscription_filter = QueryFilter(
+    active=('active', parse_bool),
+    plan=('plan', int),
+    app=('app', int),
+    **COMMON_FILTERS
+)
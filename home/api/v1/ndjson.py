@@ -0,0 +1,47 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+from home.api.v1.renderers import dumps
+
+CONTENT_TYPE = 'application/x-ndjson'
+
+
+def dump_lines(rows):
+    """Yield each row as one compact JSON line, encoded to bytes."""
+    for row in rows:
+        yield dumps(row, newline=True)
+
+
+def load_lines(stream):
+    """
+    Parse NDJSON from a file-like stream one line at a time.
+
+    Yields `(line_number, obj, error)`; blank lines are skipped and a line that
+    is not a JSON object yields an error message instead of stopping the parse.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(obj, dict):
+            yield line_number, None, 'Expected a JSON object'
+            continue
+        yield line_number, obj, None
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renders a list as one JSON line per item, anything else as one line."""
+    media_type = CONTENT_TYPE
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(dump_lines(data if isinstance(data, list) else [data]))
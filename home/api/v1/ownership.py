@@ -0,0 +1,35 @@
+from apps.models import App
+
+
+def _as_app_id(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+class AppOwnership:
+    """
+    Answers "does this user own these apps?" without loading App rows.
+
+    A single check is one indexed EXISTS query and a batch one `id IN (...)`
+    query, whatever the number of apps the user owns. Nothing is cached: a
+    per-user set of app ids would have to be reloaded in full after every
+    change to the user's apps.
+    """
+
+    def is_owner(self, user_id, app_id):
+        app_id = _as_app_id(app_id)
+        if app_id is None:
+            return False
+        return App.objects.filter(id=app_id, user=user_id).exists()
+
+    def owned_among(self, user_id, app_ids):
+        """Return the subset of `app_ids` owned by `user_id` with at most one query."""
+        wanted = {i for i in (_as_app_id(a) for a in app_ids) if i is not None}
+        if not wanted:
+            return set()
+        return set(App.objects.filter(user=user_id, id__in=wanted).values_list("id", flat=True))
+
+
+app_ownership = AppOwnership()
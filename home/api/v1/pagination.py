@@ -0,0 +1,139 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on an `(ordering field, id)` keyset, `created_at` by default.
+
+    Every page is fetched with a `WHERE (created_at, id) > (...)` range on the
+    composite index instead of an OFFSET, so page N costs the same as page 1.
+    Cursors are opaque base64 strings encoding the boundary row and direction.
+    `?ordering=` may pick another field from the view's `ordering_fields`,
+    prefixed with `-` for descending order.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering_query_param = "ordering"
+    default_ordering = "created_at"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def __init__(self):
+        self.page_size = settings.API_PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_page_size(self, request):
+        if self.page_size_query_param in request.query_params:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, request, view):
+        """Return `(field, descending)` for the request, validated against the view."""
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        field = ordering.lstrip("-")
+        if field not in getattr(view, "ordering_fields", (self.default_ordering,)):
+            raise ParseError(_("Invalid ordering"))
+        return field, ordering.startswith("-")
+
+    def encode_cursor(self, row, reverse):
+        # Rows may be model instances or named `.values_list()` tuples.
+        value = getattr(row, self.field)
+        value = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        position = json.dumps([int(reverse), value, row.id])
+        return urlsafe_b64encode(position.encode()).decode("ascii")
+
+    def decode_cursor(self, request, model_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            reverse, value, pk = json.loads(urlsafe_b64decode(encoded.encode("ascii")).decode())
+            return bool(reverse), model_field.to_python(value), int(pk)
+        except (TypeError, ValueError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field, descending = self.get_ordering(request, view)
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model._meta.get_field(self.field))
+
+        reverse = False
+        if cursor is not None:
+            reverse, value, pk = cursor
+            after = "lt" if reverse != descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{after}": value})
+                | Q(**{self.field: value, f"pk__{after}": pk})
+            )
+
+        prefix = "-" if reverse != descending else ""
+        queryset = queryset.order_by(prefix + self.field, prefix + "pk")
+
+        # One extra row tells us whether there is a page beyond this one.
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1], False)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.page[0], True)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
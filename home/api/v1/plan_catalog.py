@@ -0,0 +1,130 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from home.api.v1.singleflight import SingleFlight
+
+CatalogEntry = namedtuple('CatalogEntry', ['version', 'data', 'content', 'etag', 'last_modified', 'built_at'])
+
+
+class PrerenderedResponse(Response):
+    """A DRF response whose body was rendered ahead of time."""
+
+    def __init__(self, data, content, **kwargs):
+        super().__init__(data, **kwargs)
+        self.prerendered_content = content
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = self.content_type
+        return self.prerendered_content
+
+
+class PlanCatalog:
+    """
+    Pre-rendered JSON for the plan list and plan detail responses.
+
+    Each process keeps the rendered bytes locally, tagged with the catalog
+    version stored in the Django cache. Plan post_save / post_delete replace
+    the version (see `home.signals`), so every process that shares the cache
+    rebuilds on its next request. Processes that don't share it (the default
+    local-memory cache) only see the change once their copy is older than
+    `PLAN_CATALOG_TTL` seconds, which bounds how stale any entry gets. A rebuild is single-flight: concurrent
+    requests for the same entry get the previous version meanwhile, or wait
+    for the rebuild if there is none.
+    """
+
+    version_key = 'plan-catalog:version'
+    content_type = 'application/json'
+
+    def __init__(self, cache_alias='default'):
+        self.cache_alias = cache_alias
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.flight = SingleFlight.from_settings('plan-catalog')
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = self.cache.get(self.version_key)
+        return version
+
+    def _bump(self):
+        self.cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def bump(self):
+        self._bump()
+        # An entry rebuilt from the old rows before the commit would be served
+        # until it expires: bump again on commit.
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(self._bump)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, build):
+        """
+        Return the entry for `key`, calling `build()` for
+        `(data, content, last_modified)` when the local copy is missing, from
+        an older version or older than `PLAN_CATALOG_TTL`.
+        """
+        version = self.version()
+        entry = self._entries.get(key)
+        if (entry is not None and entry.version == version
+                and time.monotonic() - entry.built_at < settings.PLAN_CATALOG_TTL):
+            return entry
+        return self.flight.do((key, version), lambda: self._build(key, version, build), stale=entry)
+
+    def _build(self, key, version, build):
+        data, content, last_modified = build()
+        entry = CatalogEntry(
+            version, data, content, quote_etag(hashlib.sha1(content).hexdigest()), last_modified,
+            time.monotonic(),
+        )
+        with self._lock:
+            for stale in [k for k, e in self._entries.items() if e.version != version]:
+                del self._entries[stale]
+            self._entries[key] = entry
+        return entry
+
+    @staticmethod
+    def serves(request):
+        """The catalog only covers plain JSON reads without query options."""
+        return not request.query_params and request.accepted_media_type == PlanCatalog.content_type
+
+    def response(self, request, key, build):
+        entry = self.get(key, build)
+        last_modified = int(entry.last_modified.timestamp()) if entry.last_modified else None
+        response = get_conditional_response(
+            request._request, etag=entry.etag, last_modified=last_modified
+        )
+        if response is None:
+            response = PrerenderedResponse(entry.data, entry.content, content_type=self.content_type)
+        response['ETag'] = entry.etag
+        if entry.last_modified is not None:
+            response['Last-Modified'] = http_date(entry.last_modified.timestamp())
+        return response
+
+
+def add_cache_control(response):
+    if response.status_code in (200, 304):
+        patch_cache_control(response, public=True, max_age=settings.PLAN_CATALOG_MAX_AGE)
+    return response
+
+
+plan_catalog = PlanCatalog()
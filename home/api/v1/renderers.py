@@ -0,0 +1,95 @@
+"""
+Faster JSON and MessagePack renderers / parsers.
+
+orjson and msgpack are optional: without orjson the JSON classes behave
+exactly like DRF's, and settings only offer application/msgpack when msgpack
+is installed. Values the libraries don't handle natively (Decimal, lazy
+strings, ...) are converted the way DRF's JSONEncoder converts them, so every
+format carries the same data.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+_encoder = JSONEncoder()
+
+
+def default(obj):
+    return _encoder.default(obj)
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data, indent=False, newline=False):
+    """Serialize `data` to compact UTF-8 JSON bytes, with orjson if available."""
+    if orjson is None:
+        content = JSONEncoder(ensure_ascii=False, separators=(',', ':'), indent=2 if indent else None).encode(data)
+        return (content + '\n' if newline else content).encode('utf-8')
+    option = ORJSON_OPTIONS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    if newline:
+        option |= orjson.OPT_APPEND_NEWLINE
+    return orjson.dumps(data, default=default, option=option)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """`application/json` through orjson; output matches DRF's JSONRenderer."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        # orjson only indents by two spaces; any requested indent gets that.
+        content = dumps(data, indent=bool(self.get_indent(accepted_media_type, renderer_context or {})))
+        # Like DRF, escape U+2028 / U+2029 so the output is also valid JavaScript.
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ORJSONParser(JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % exc)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MSGPACK_CONTENT_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = MSGPACK_CONTENT_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError('MessagePack parse error - %s' % exc)
@@ -0,0 +1,158 @@
+import hashlib
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from home.api.v1.plan_catalog import PrerenderedResponse
+from home.api.v1.singleflight import SingleFlight
+
+CachedResponse = namedtuple(
+    'CachedResponse', ['data', 'content', 'content_type', 'etag', 'last_modified', 'expires'])
+
+
+class UserResponseCache:
+    """
+    Rendered GET responses of the per-user endpoints (apps, subscriptions).
+
+    Every key embeds the user's version counter, and a global one for data
+    shared between users (plans, via `?expand=plan`). Writes bump the counter
+    (see `home.signals` and `home.api.v1.bulk`), which makes all of the
+    user's earlier entries unreachable in O(1); they simply expire.
+
+    Entries are fresh for `ttl` seconds and kept `stale_ttl` longer. Misses
+    and refreshes go through a shared single-flight, so one request rebuilds
+    an entry while concurrent ones wait for it or get the stale copy.
+    """
+
+    version_prefix = 'api-version:'
+    entry_prefix = 'api-response:'
+    shared_version_key = 'api-version:*'
+
+    def __init__(self, ttl=300, stale_ttl=60, cache_alias='default'):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_alias = cache_alias
+        self.flight = SingleFlight.from_settings('api-response')
+
+    @classmethod
+    def from_settings(cls):
+        return cls(ttl=settings.API_RESPONSE_CACHE_TTL, stale_ttl=settings.API_RESPONSE_CACHE_STALE_TTL)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _version_key(self, user_id):
+        return f'{self.version_prefix}{user_id}'
+
+    def version(self, user_id):
+        keys = [self._version_key(user_id), self.shared_version_key]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Start from the clock rather than 1, so a counter that was
+                # evicted never comes back to a value that has been used.
+                self.cache.add(key, time.time_ns(), None)
+                versions[key] = self.cache.get(key)
+        return '.'.join(str(versions[key]) for key in keys)
+
+    def _bump(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, time.time_ns(), None)
+
+    def _bump_now_and_on_commit(self, key):
+        self._bump(key)
+        # A read before the commit could still cache the old rows under the
+        # new version, so bump once more when the transaction commits.
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: self._bump(key))
+
+    def bump(self, user_id):
+        """Invalidate every cached response of `user_id`."""
+        self._bump_now_and_on_commit(self._version_key(user_id))
+
+    def bump_all(self):
+        self._bump_now_and_on_commit(self.shared_version_key)
+
+    def key(self, request, user_id):
+        # The host is included because pagination links are absolute URLs.
+        digest = hashlib.sha1('|'.join([
+            request.get_host(),
+            request.get_full_path(),
+            request.accepted_media_type,
+            request.META.get('HTTP_ACCEPT', ''),
+        ]).encode()).hexdigest()
+        return f'{self.entry_prefix}{user_id}:{self.version(user_id)}:{digest}'
+
+    def cacheable(self, request):
+        # The browsable API renders per-request forms, so it is never cached.
+        return self.ttl > 0 and request.accepted_renderer.format != 'api'
+
+    def fresh(self, key):
+        entry = self.cache.get(key)
+        return entry if entry is not None and entry.expires > time.time() else None
+
+    def response(self, view, request, user_id, build_response):
+        """
+        Serve a GET from the cache, answering conditional requests from the
+        stored validators, or call `build_response()` and store its 200.
+        """
+        if not self.cacheable(request):
+            return build_response()
+        key = self.key(request, user_id)
+        entry = self.cache.get(key)
+        built = []
+
+        def compute():
+            response = build_response()
+            built.append(response)
+            if response.status_code != 200 or not hasattr(response, 'data'):
+                return None
+            entry = self.render(view, request, response)
+            self.cache.set(key, entry, self.ttl + self.stale_ttl)
+            return entry
+
+        if entry is None or entry.expires <= time.time():
+            entry = self.flight.do(key, compute, stale=entry, lookup=lambda: self.fresh(key), shared=True)
+            if entry is None:
+                # Not cacheable (an error, a 304, ...): each request answers for itself.
+                return built[0] if built else build_response()
+
+        not_modified = get_conditional_response(
+            request._request, etag=entry.etag, last_modified=entry.last_modified)
+        if not_modified is not None:
+            return self.apply(entry, not_modified)
+        return self.apply(entry, PrerenderedResponse(entry.data, entry.content, content_type=entry.content_type))
+
+    def render(self, view, request, response):
+        renderer = request.accepted_renderer
+        content = renderer.render(response.data, request.accepted_media_type, {
+            'view': view, 'request': request, 'response': response,
+        })
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        last_modified = response.get('Last-Modified')
+        return CachedResponse(
+            response.data, content, content_type, response.get('ETag'),
+            parse_http_date_safe(last_modified) if last_modified else None,
+            time.time() + self.ttl,
+        )
+
+    @staticmethod
+    def apply(entry, response):
+        if entry.etag:
+            response['ETag'] = entry.etag
+        if entry.last_modified is not None:
+            response['Last-Modified'] = http_date(entry.last_modified)
+        return response
+
+
+response_cache = UserResponseCache.from_settings()
@@ -10,6 +10,7 @@ from rest_framework import serializers
 from rest_auth.serializers import PasswordResetSerializer
 from subscriptions.models import Plan, Subscription
 from apps.models import App
+from home import metrics
 
 
 
@@ -78,19 +79,100 @@ class PasswordSerializer(PasswordResetSerializer):
     """Custom serializer for rest_auth to solve reset password error"""
     password_reset_form_class = ResetPasswordForm
 
-class PlanSerializer(serializers.ModelSerializer):
+class TimedDataMixin:
+    """Counts building `.data` towards the request's serialization time (home.metrics)."""
+
+    @property
+    def data(self):
+        with metrics.serializing():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class ExpandableFieldsMixin:
+    """
+    Replaces related-object ids with nested representations on request.
+
+    `expandable_fields` maps a field name to the serializer used to inline it;
+    pass `expand=[...]` when constructing the serializer to pick which ones.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for field_name in expand:
+            self.fields[field_name] = self.expandable_fields[field_name](read_only=True)
+
+
+class SparseFieldsMixin:
+    """
+    Narrows the serialized fields to `fields=[...]` and/or drops `omit=[...]`.
+    """
+
+    def __init__(self, *args, fields=None, omit=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+        for field_name in omit:
+            self.fields.pop(field_name, None)
+
+
+class PlanSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Plan
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
-class AppSerializer(serializers.ModelSerializer):
+class AppSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = App
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
+
+class SubscriptionSerializer(TimedDataMixin, SparseFieldsMixin, ExpandableFieldsMixin,
+                             serializers.ModelSerializer):
+    expandable_fields = {
+        'plan': PlanSerializer,
+        'app': AppSerializer,
+        'user': UserSerializer,
+    }
 
-class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
+
+
+class BulkSubscriptionSerializer(serializers.Serializer):
+    """
+    Query-free shape validation for one item of a bulk subscription write;
+    foreign keys and ownership are checked for the whole batch at once.
+    """
+    id = serializers.IntegerField(required=False)
+    user = serializers.IntegerField()
+    plan = serializers.IntegerField(required=False)
+    app = serializers.IntegerField(required=False)
+    active = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        if 'id' not in attrs:
+            missing = {'plan', 'app'} - set(attrs)
+            if missing:
+                raise serializers.ValidationError(
+                    {name: [_('This field is required.')] for name in sorted(missing)})
+        return attrs
+
 
+class AppImportSerializer(AppSerializer):
+    """
+    AppSerializer rules without per-row queries, for NDJSON imports: the
+    importing user owns every row and name uniqueness is checked per chunk.
+    """
 
+    class Meta(AppSerializer.Meta):
+        read_only_fields = ('user',)
+        extra_kwargs = {'name': {'validators': []}}
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+FLIGHTS = {}
+
+
+class Call:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs one computation per key at a time and shares its result.
+
+    Concurrent callers in the same process wait for the running call (or take
+    the `stale` value they already have). With `shared=True` the leader also
+    takes a lock key in the Django cache, so leaders in other processes return
+    `stale`, or poll `lookup()` until the first one has stored its result.
+
+    Stampede counters are kept per process (`local`) and, for `manage.py
+    singleflight_stats`, summed across processes in the cache.
+    """
+
+    counter_names = ('leaders', 'coalesced', 'stale', 'lock_waits', 'timeouts')
+
+    def __init__(self, name, wait_timeout=10, lock_timeout=30, poll_interval=0.05, cache_alias='default'):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.cache_alias = cache_alias
+        self.local = Counter()
+        self._calls = {}
+        self._lock = threading.Lock()
+        FLIGHTS[name] = self
+
+    @classmethod
+    def from_settings(cls, name):
+        return cls(
+            name,
+            wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT,
+            lock_timeout=settings.SINGLEFLIGHT_LOCK_TIMEOUT,
+        )
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _counter_key(self, counter):
+        return f'singleflight:{self.name}:{counter}'
+
+    def count(self, counter):
+        with self._lock:
+            self.local[counter] += 1
+        key = self._counter_key(counter)
+        if not self.cache.add(key, 1, None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                pass
+
+    def stats(self):
+        """Counters summed over every process sharing the cache."""
+        values = self.cache.get_many([self._counter_key(c) for c in self.counter_names])
+        return {c: values.get(self._counter_key(c), 0) for c in self.counter_names}
+
+    def do(self, key, compute, stale=None, lookup=None, shared=False):
+        """Return `compute()` for `key`, computed once for all concurrent callers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Call()
+
+        if not leader:
+            if stale is not None:
+                self.count('stale')
+                return stale
+            self.count('coalesced')
+            if not call.event.wait(self.wait_timeout):
+                self.count('timeouts')
+                return compute()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._lead(key, compute, stale, lookup, shared)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _lead(self, key, compute, stale, lookup, shared):
+        if not shared:
+            self.count('leaders')
+            return compute()
+
+        lock_key = f'singleflight:{self.name}:lock:{key}'
+        if self.cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                self.count('leaders')
+                return compute()
+            finally:
+                self.cache.delete(lock_key)
+
+        # Another process is computing this key.
+        if stale is not None:
+            self.count('stale')
+            return stale
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = lookup() if lookup is not None else None
+            if value is not None:
+                self.count('lock_waits')
+                return value
+            if self.cache.get(lock_key) is None:
+                # It finished without storing anything we can use.
+                break
+        else:
+            self.count('timeouts')
+            return compute()
+        self.count('leaders')
+        return compute()
+
+    def reset(self):
+        with self._lock:
+            self.local.clear()
+        self.cache.delete_many([self._counter_key(c) for c in self.counter_names])
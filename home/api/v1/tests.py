@@ -1,3 +1,11 @@
+import gzip
+import json
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
 from rest_framework.reverse import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -5,6 +13,30 @@ from users.models import User
 from subscriptions.models import Plan, Subscription
 from apps.models import App
 from rest_framework.authtoken.models import Token
+from django.db import connection
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from django.core.cache import cache
+from unittest import mock
+from rest_framework.renderers import JSONRenderer
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+from home import middleware
+from home.checks import check_response_cache_backend
+from home.api.v1.fastserializers import ValuesSerializer
+from home.api.v1.ownership import app_ownership
+from home.api.v1.plan_catalog import plan_catalog
+from home.api.v1 import renderers
+from home.api.v1.response_cache import response_cache
+from home.api.v1.singleflight import SingleFlight
+from home.api.v1.serializers import AppSerializer, PlanSerializer, SubscriptionSerializer
+from home.api.v1.viewsets import AppViewSet
 
 class RestApiTests(APITestCase):
 
@@ -31,6 +63,7 @@ class RestApiTests(APITestCase):
 
 
     def setUp(self):
+        cache.clear()
         self.token = Token.objects.create(user=User.objects.get(username='Test User1'))
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
 
@@ -75,8 +108,17 @@ class RestApiTests(APITestCase):
         url = reverse('apps-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]['name'], 'App One')
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data['results'][0]['name'], 'App One')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_apps_query_count(self):
+        # Token authentication, the ETag aggregate and the apps query;
+        # no extra token lookups.
+        url = reverse('apps-list')
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_list_apps_unauthenticated(self):
         self.client.force_authenticate(user=None, token=None)
@@ -182,7 +224,13 @@ class RestApiTests(APITestCase):
         url = reverse('subscriptions-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_list_subscription_query_count(self):
+        url = reverse('subscriptions-list')
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_list_subscription_unauthenticated(self):
         self.client.force_authenticate(user=None, token=None)
@@ -290,3 +338,988 @@ class RestApiTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertContains(response,'key')
 
+
+class TokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Token User', email='tok@test.com', password='password1')
+        self.token = Token.objects.create(user=self.user)
+        self.app = App.objects.create(name='Token App', description='Token', user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_token_resolved_once_per_request(self):
+        for url in (reverse('apps-list'), reverse('subscriptions-list')):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            token_queries = [q['sql'] for q in queries if 'authtoken_token' in q['sql']]
+            self.assertEqual(len(token_queries), 1)
+
+    def test_deleted_token(self):
+        self.token.delete()
+        response = self.client.get(reverse('apps-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AppOwnershipTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='Owner', email='owner@test.com', password='password1')
+        self.other = User.objects.create_user(username='Other', email='other@test.com', password='password1')
+        self.apps = [
+            App.objects.create(name=f'Owned {i}', description='Owned', user=self.owner) for i in range(3)
+        ]
+        self.foreign = App.objects.create(name='Foreign', description='Foreign', user=self.other)
+
+    def test_is_owner_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(app_ownership.is_owner(self.owner.id, str(self.apps[0].id)))
+        with self.assertNumQueries(1):
+            self.assertFalse(app_ownership.is_owner(self.owner.id, self.foreign.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(app_ownership.is_owner(self.owner.id, 'not-an-id'))
+
+    def test_owned_among_batch(self):
+        ids = [a.id for a in self.apps] + [self.foreign.id, 'not-an-id']
+        with self.assertNumQueries(1):
+            owned = app_ownership.owned_among(self.owner.id, ids)
+        self.assertEqual(owned, {a.id for a in self.apps})
+        with self.assertNumQueries(0):
+            self.assertEqual(app_ownership.owned_among(self.owner.id, ['not-an-id']), set())
+
+    def test_reassigned_app(self):
+        app = App.objects.get(id=self.apps[0].id)
+        app.user = self.other
+        app.save()
+        self.assertFalse(app_ownership.is_owner(self.owner.id, app.id))
+        self.assertTrue(app_ownership.is_owner(self.other.id, app.id))
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Pager', email='pager@test.com', password='password1')
+        cls.apps = [
+            App.objects.create(name=f'Paged {i:02}', description='Paged', user=cls.user) for i in range(7)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def collect(self, url):
+        names, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            names += [row['name'] for row in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return names, pages
+
+    def test_walks_all_pages_in_order(self):
+        names, pages = self.collect(reverse('apps-list') + '?page_size=3')
+        self.assertEqual(names, [app.name for app in self.apps])
+        self.assertEqual(pages, 3)
+
+    def test_previous_link(self):
+        response = self.client.get(reverse('apps-list') + '?page_size=3')
+        self.assertIsNone(response.data['previous'])
+        second = self.client.get(response.data['next'])
+        third = self.client.get(second.data['next'])
+        back = self.client.get(third.data['previous'])
+        self.assertEqual(back.data['results'], second.data['results'])
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=2):
+            response = self.client.get(reverse('apps-list') + '?page_size=50')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_later_pages_cost_the_same(self):
+        response = self.client.get(reverse('apps-list') + '?page_size=2')
+        with self.assertNumQueries(2):
+            self.client.get(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('apps-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SubscriptionExpandTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Expander', email='expand@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard Plan', price=10)
+        for i in range(10):
+            app = App.objects.create(name=f'Expanded {i}', description='Expanded', user=cls.user)
+            Subscription.objects.create(user=cls.user, plan=cls.plan, app=app, active=True)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_ids_without_expand(self):
+        response = self.client.get(reverse('subscriptions-list'))
+        row = response.data['results'][0]
+        self.assertEqual(row['plan'], self.plan.id)
+        self.assertIsInstance(row['app'], int)
+
+    def test_expand_inlines_related_objects(self):
+        response = self.client.get(reverse('subscriptions-list') + '?expand=plan,app,user')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.data['results'][0]
+        self.assertEqual(row['plan']['name'], 'Std')
+        self.assertEqual(row['app']['name'], 'Expanded 0')
+        self.assertEqual(row['user']['email'], 'expand@test.com')
+
+    def test_expand_query_count_is_constant(self):
+        url = reverse('subscriptions-list') + '?expand=plan,app,user'
+        with self.assertNumQueries(1):
+            self.client.get(url + '&page_size=2')
+        with self.assertNumQueries(1):
+            response = self.client.get(url + '&page_size=10')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_expand_retrieve(self):
+        sub = Subscription.objects.filter(user=self.user).first()
+        url = reverse('subscriptions-detail', kwargs={'pk': sub.id}) + '?expand=plan'
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data[0]['plan']['price'], '10.00')
+
+    def test_unknown_expand_field(self):
+        response = self.client.get(reverse('subscriptions-list') + '?expand=owner')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SparseFieldsetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Sparse', email='sparse@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard Plan', price=10)
+        cls.app = App.objects.create(name='Sparse App', description='Sparse', user=cls.user)
+        cls.subscription = Subscription.objects.create(user=cls.user, plan=cls.plan, app=cls.app, active=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_app_fields(self):
+        url = reverse('apps-list') + '?fields=id,name,type'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'type'})
+        self.assertNotIn('description', queries[-1]['sql'])
+
+    def test_app_omit(self):
+        url = reverse('apps-detail', kwargs={'pk': self.app.id}) + '?omit=description,screenshot'
+        response = self.client.get(url)
+        self.assertNotIn('description', response.data[0])
+        self.assertNotIn('screenshot', response.data[0])
+        self.assertEqual(response.data[0]['name'], 'Sparse App')
+
+    def test_plan_fields(self):
+        response = self.client.get(reverse('plans-list') + '?fields=id,name')
+        self.assertEqual(set(response.data[0]), {'id', 'name'})
+
+    def test_subscription_fields_with_expand(self):
+        url = reverse('subscriptions-list') + '?fields=id,plan&expand=plan,app'
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'plan'})
+        self.assertEqual(row['plan']['description'], 'Standard Plan')
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('apps-list') + '?fields=id,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('plans-list') + '?omit=secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_joins_only_expanded_relations(self):
+        for name, pk in (('apps-detail', self.app.id), ('subscriptions-detail', self.subscription.id)):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name, kwargs={'pk': pk}))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('JOIN', queries[-1]['sql'])
+
+        url = reverse('subscriptions-detail', kwargs={'pk': self.subscription.id}) + '?expand=plan'
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertIn('JOIN "subscriptions_plan"', queries[-1]['sql'])
+        self.assertNotIn('users_user', queries[-1]['sql'])
+
+    def test_unknown_field_on_retrieve(self):
+        for query in ('?fields=bogus', '?omit=id,bogus'):
+            for name, pk in (('apps-detail', self.app.id), ('subscriptions-detail', self.subscription.id)):
+                response = self.client.get(reverse(name, kwargs={'pk': pk}) + query)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('bogus', response.data['error'][0])
+
+
+class ValuesSerializerTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Fast', email='fast@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard Plan', price='9.90')
+        cls.app = App.objects.create(name='Fast App', description='Fast', type='ty2', framework='fw2',
+                                     domain_name='fast.example.com', screenshot='https://example.com/s.png',
+                                     user=cls.user)
+        App.objects.create(name='Bare App', description='Bare', user=cls.user)
+        Subscription.objects.create(user=cls.user, plan=cls.plan, app=cls.app, active=True)
+        Subscription.objects.create(user=cls.user, plan=cls.plan, app=None)
+
+    def assertSameOutput(self, serializer_class, queryset, **options):
+        fast = ValuesSerializer.for_serializer(serializer_class, **options)
+        self.assertIsNotNone(fast)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, **options).data)
+        self.assertEqual(JSONRenderer().render(fast.serialize(fast.queryset(queryset))), expected)
+
+    def test_matches_model_serializers(self):
+        self.assertSameOutput(AppSerializer, App.objects.order_by('id'))
+        self.assertSameOutput(PlanSerializer, Plan.objects.order_by('id'))
+        self.assertSameOutput(SubscriptionSerializer, Subscription.objects.order_by('id'))
+
+    def test_matches_with_sparse_fields(self):
+        self.assertSameOutput(AppSerializer, App.objects.order_by('id'), fields=['name', 'id', 'type'])
+        self.assertSameOutput(SubscriptionSerializer, Subscription.objects.order_by('id'), omit=['created_at'])
+
+    def test_expand_uses_model_serializer(self):
+        self.assertIsNone(ValuesSerializer.for_serializer(SubscriptionSerializer, expand=['plan']))
+
+    def test_viewset_output_matches(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('apps-list')
+        fast = self.client.get(url)
+        with mock.patch.object(AppViewSet, 'fast_read', False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.content, slow.content)
+
+
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Poller', email='poll@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard Plan', price=10)
+        cls.app = App.objects.create(name='Polled App', description='Polled', user=cls.user)
+        cls.subscription = Subscription.objects.create(user=cls.user, plan=cls.plan, app=cls.app, active=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_sends_validators(self):
+        response = self.client.get(reverse('apps-list'))
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get(reverse('apps-detail', kwargs={'pk': self.app.id}))
+        self.assertIn('Last-Modified', response)
+
+    def test_if_modified_since_after_delete(self):
+        other = App.objects.create(name='Deleted App', description='Deleted', user=self.user)
+        url = reverse('apps-list')
+        since = http_date(time.time() + 60)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, status.HTTP_200_OK)
+        self.client.post(reverse('apps-bulk-delete'), {'ids': [other.id]}, format='json')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([app['id'] for app in response.data['results']], [self.app.id])
+
+    @mock.patch.object(response_cache, 'ttl', 300)
+    def test_if_none_match_short_circuits(self):
+        url = reverse('apps-list')
+        etag = self.client.get(url)['ETag']
+        # Answered from the cached response's validators.
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        url = reverse('subscriptions-detail', kwargs={'pk': self.subscription.id})
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_on_update(self):
+        url = reverse('apps-detail', kwargs={'pk': self.app.id})
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'description': 'Changed'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_varies_with_query(self):
+        url = reverse('apps-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url + '?fields=id', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @mock.patch.object(response_cache, 'ttl', 0)
+    def test_expanded_relation_changes_etag(self):
+        url = reverse('subscriptions-list') + '?expand=plan'
+        etag = self.client.get(url)['ETag']
+        Plan.objects.filter(id=self.plan.id).update(updated_at=self.plan.updated_at.replace(year=2100))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_plan_detail(self):
+        url = reverse('plans-detail', kwargs={'pk': self.plan.id})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class PlanCatalogTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.free = Plan.objects.create(name='Free', description='Free Plan', price=0)
+        cls.pro = Plan.objects.create(name='Pro', description='Pro Plan', price=25)
+
+    def setUp(self):
+        plan_catalog.clear()
+        plan_catalog.bump()
+
+    def test_cached_list_needs_no_queries(self):
+        url = reverse('plans-list')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['Content-Type'], 'application/json')
+        self.assertEqual(second.data[1]['name'], 'Pro')
+
+    def test_matches_uncached_rendering(self):
+        cached = self.client.get(reverse('plans-list'))
+        uncached = self.client.get(reverse('plans-list') + '?omit=')
+        self.assertEqual(cached.content, uncached.content)
+
+    def test_cache_control(self):
+        response = self.client.get(reverse('plans-detail', kwargs={'pk': self.pro.id}))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+        response = self.client.get(reverse('plans-list') + '?fields=id')
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_plan_save_bumps_version(self):
+        url = reverse('plans-detail', kwargs={'pk': self.pro.id})
+        etag = self.client.get(url)['ETag']
+        self.pro.price = 30
+        self.pro.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['price'], '30.00')
+
+    def test_plan_delete_bumps_version(self):
+        self.client.get(reverse('plans-list'))
+        Plan.objects.create(name='Gone', description='Deleted Plan', price=1).delete()
+        response = self.client.get(reverse('plans-list'))
+        self.assertEqual(len(response.data), 2)
+
+    def test_not_modified_from_cache(self):
+        url = reverse('plans-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_plan(self):
+        response = self.client.get(reverse('plans-detail', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('plans-detail', kwargs={'pk': 'pro'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(plan_catalog._entries, {})
+
+    def test_one_entry_per_plan(self):
+        self.client.get(reverse('plans-detail', kwargs={'pk': self.pro.id}))
+        for pk in (f'0{self.pro.id}', f'00{self.pro.id}'):
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('plans-detail', kwargs={'pk': pk}))
+            self.assertEqual(response.data['name'], 'Pro')
+        self.assertEqual(list(plan_catalog._entries), [self.pro.id])
+
+    def test_rebuilt_after_ttl(self):
+        url = reverse('plans-list')
+        self.client.get(url)
+        # A change another process made, whose version bump this one can't see.
+        Plan.objects.filter(id=self.pro.id).update(price=30)
+        self.assertEqual(self.client.get(url).data[1]['price'], '25.00')
+        with mock.patch('home.api.v1.plan_catalog.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(self.client.get(url).data[1]['price'], '30.00')
+
+    def test_bumped_again_on_commit(self):
+        with mock.patch('home.api.v1.plan_catalog.transaction.on_commit') as on_commit:
+            plan_catalog.bump()
+        version = plan_catalog.version()
+        on_commit.call_args[0][0]()
+        self.assertNotEqual(plan_catalog.version(), version)
+
+
+class FilterOrderingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Filterer', email='filter@test.com', password='password1')
+        cls.std = Plan.objects.create(name='Std', description='Standard Plan', price=10)
+        cls.pro = Plan.objects.create(name='Pro', description='Pro Plan', price=25)
+        cls.apps = [
+            App.objects.create(name='Charlie', description='Web', type='ty1', framework='fw1', user=cls.user),
+            App.objects.create(name='Alpha', description='Mobile', type='ty2', framework='fw2', user=cls.user),
+            App.objects.create(name='Bravo', description='Mobile', type='ty2', framework='fw1', user=cls.user),
+        ]
+        cls.subs = [
+            Subscription.objects.create(user=cls.user, plan=cls.std, app=cls.apps[0], active=True),
+            Subscription.objects.create(user=cls.user, plan=cls.pro, app=cls.apps[1], active=False),
+            Subscription.objects.create(user=cls.user, plan=cls.pro, app=cls.apps[2], active=True),
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def names(self, query):
+        response = self.client.get(reverse('apps-list') + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['name'] for row in response.data['results']]
+
+    def sub_ids(self, query):
+        response = self.client.get(reverse('subscriptions-list') + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_app_filters(self):
+        self.assertEqual(self.names('?type=ty2'), ['Alpha', 'Bravo'])
+        self.assertEqual(self.names('?type=ty2&framework=fw1'), ['Bravo'])
+
+    def test_subscription_filters(self):
+        self.assertEqual(self.sub_ids('?active=true'), [self.subs[0].id, self.subs[2].id])
+        self.assertEqual(self.sub_ids(f'?plan={self.pro.id}&active=false'), [self.subs[1].id])
+        self.assertEqual(self.sub_ids(f'?app={self.apps[2].id}'), [self.subs[2].id])
+
+    def test_created_range(self):
+        Subscription.objects.filter(id=self.subs[0].id).update(created_at='2020-01-01T00:00:00Z')
+        self.assertEqual(self.sub_ids('?created_before=2021-01-01'), [self.subs[0].id])
+        self.assertEqual(self.sub_ids('?created_after=2021-01-01'), [self.subs[1].id, self.subs[2].id])
+
+    def test_multi_get(self):
+        ids = f'{self.apps[2].id},{self.apps[0].id}'
+        self.assertEqual(self.names('?ids=' + ids), ['Charlie', 'Bravo'])
+
+    def test_ordering(self):
+        self.assertEqual(self.names('?ordering=name'), ['Alpha', 'Bravo', 'Charlie'])
+        self.assertEqual(self.names('?ordering=-created_at'), ['Bravo', 'Alpha', 'Charlie'])
+
+    def test_ordering_paginates(self):
+        url = reverse('apps-list') + '?ordering=-name&page_size=2&fields=id'
+        first = self.client.get(url)
+        second = self.client.get(first.data['next'])
+        ids = [row['id'] for row in first.data['results'] + second.data['results']]
+        self.assertEqual(ids, [self.apps[0].id, self.apps[2].id, self.apps[1].id])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_invalid_values(self):
+        for query in ('?ordering=description', '?active=maybe', '?ids=1,x', '?created_after=soon'):
+            response = self.client.get(reverse('subscriptions-list') + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class BulkSubscriptionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Bulk', email='bulk@test.com', password='password1')
+        cls.other = User.objects.create_user(username='Bulk Other', email='bulk2@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard Plan', price=10)
+        cls.apps = [App.objects.create(name=f'Bulk {i}', description='Bulk', user=cls.user) for i in range(20)]
+        cls.foreign = App.objects.create(name='Bulk Foreign', description='Foreign', user=cls.other)
+        cls.existing = Subscription.objects.create(user=cls.user, plan=cls.plan, app=cls.apps[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('subscriptions-bulk')
+
+    def item(self, app, **extra):
+        return dict({'user': self.user.id, 'plan': self.plan.id, 'app': app.id, 'active': True}, **extra)
+
+    def test_create_and_update(self):
+        items = [self.item(app) for app in self.apps[1:4]]
+        items.append({'id': self.existing.id, 'user': self.user.id, 'active': True})
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['updated']), (3, 1))
+        self.assertEqual([row['app'] for row in response.data['results']],
+                         [a.id for a in self.apps[1:4]] + [self.apps[0].id])
+        self.assertTrue(all(row['id'] for row in response.data['results']))
+        self.assertEqual(Subscription.objects.filter(user=self.user, active=True).count(), 4)
+
+    def test_query_count_is_constant(self):
+        def run(apps):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, [self.item(app) for app in apps], format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+        self.assertEqual(run(self.apps[1:3]), run(self.apps[3:20]))
+
+    def test_per_item_errors_write_nothing(self):
+        items = [
+            self.item(self.apps[5]),
+            self.item(self.foreign),
+            self.item(self.apps[0]),
+            self.item(self.apps[6], plan=999),
+            {'user': self.user.id, 'app': self.apps[7].id},
+            self.item(self.apps[8], user=self.other.id),
+            self.item(self.apps[9]),
+            self.item(self.apps[9]),
+        ]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('app', errors[1])
+        self.assertIn('app', errors[2])
+        self.assertIn('plan', errors[3])
+        self.assertIn('plan', errors[4])
+        self.assertIn('user', errors[5])
+        self.assertEqual(errors[6], {})
+        self.assertIn('app', errors[7])
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 1)
+
+    def test_move_frees_the_old_app(self):
+        items = [
+            {'id': self.existing.id, 'user': self.user.id, 'app': self.apps[1].id},
+            self.item(self.apps[0]),
+        ]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.app_id, self.apps[1].id)
+        self.assertTrue(Subscription.objects.filter(user=self.user, app=self.apps[0]).exists())
+
+    def test_rejects_non_list(self):
+        response = self.client.post(self.url, self.item(self.apps[1]), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AppNDJSONTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Porter', email='port@test.com', password='password1')
+        cls.apps = [App.objects.create(name=f'Ported {i}', description='Ported', type='ty1', framework='fw1',
+                                       user=cls.user) for i in range(3)]
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def post_ndjson(self, body):
+        return self.client.generic('POST', reverse('apps-import'), body,
+                                   content_type='application/x-ndjson')
+
+    def test_export_streams_ndjson(self):
+        response = self.client.get(reverse('apps-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], [a.name for a in self.apps])
+        self.assertEqual(json.loads(lines[0]), AppSerializer(self.apps[0]).data)
+
+    def test_import_in_chunks(self):
+        body = '\n'.join(json.dumps({'name': f'Imported {i}', 'description': 'Imported', 'user': 999})
+                         for i in range(5)) + '\n\n'
+        with self.settings(NDJSON_CHUNK_SIZE=2), CaptureQueriesContext(connection) as queries:
+            response = self.post_ndjson(body)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(App.objects.filter(user=self.user, name__startswith='Imported').count(), 5)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_import_roundtrip(self):
+        exported = b''.join(self.client.get(reverse('apps-export')).streaming_content)
+        App.objects.filter(user=self.user).delete()
+        response = self.post_ndjson(exported)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(list(App.objects.filter(user=self.user).values_list('name', flat=True).order_by('name')),
+                         [a.name for a in self.apps])
+
+    def test_import_errors_roll_back(self):
+        body = '\n'.join([
+            json.dumps({'name': 'Fresh', 'description': 'ok'}),
+            'not json',
+            json.dumps({'name': 'Ported 0', 'description': 'duplicate'}),
+            json.dumps({'name': 'Bad type', 'description': 'bad', 'type': 'ty9'}),
+            json.dumps({'name': 'Fresh', 'description': 'duplicate in file'}),
+        ])
+        response = self.post_ndjson(body)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sorted(e['line'] for e in response.data['errors']), [2, 3, 4, 5])
+        self.assertFalse(App.objects.filter(name='Fresh').exists())
+
+
+class AppDeleteTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Deleter', email='delete@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard Plan', price=10)
+        cls.apps = [App.objects.create(name=f'Doomed {i}', description='Doomed', user=cls.user) for i in range(12)]
+        for app in cls.apps:
+            Subscription.objects.create(user=cls.user, plan=cls.plan, app=app, active=True)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_destroy_deactivates_subscriptions(self):
+        app = self.apps[0]
+        sub = Subscription.objects.get(app=app)
+        response = self.client.delete(reverse('apps-detail', kwargs={'pk': app.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        sub.refresh_from_db()
+        self.assertFalse(sub.active)
+        self.assertIsNone(sub.app_id)
+        self.assertFalse(App.objects.filter(id=app.id).exists())
+
+    def test_destroy_missing_app_changes_nothing(self):
+        response = self.client.delete(reverse('apps-detail', kwargs={'pk': 9999}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Subscription.objects.filter(user=self.user, active=True).count(), 12)
+
+    def test_bulk_delete_statement_count_is_constant(self):
+        url = reverse('apps-bulk-delete')
+
+        def run(apps):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, {'ids': [a.id for a in apps]}, format='json')
+            self.assertEqual(response.data['deleted'], len(apps))
+            return len(queries)
+
+        self.assertEqual(run(self.apps[:2]), run(self.apps[2:12]))
+        self.assertFalse(Subscription.objects.filter(user=self.user, active=True).exists())
+
+    def test_bulk_delete_ignores_foreign_apps(self):
+        other = User.objects.create_user(username='Keeper', email='keep@test.com', password='password1')
+        kept = App.objects.create(name='Kept', description='Kept', user=other)
+        response = self.client.post(reverse('apps-bulk-delete'), {'ids': [kept.id, self.apps[0].id]}, format='json')
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertTrue(App.objects.filter(id=kept.id).exists())
+
+
+class UserResponseCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Cached', email='cached@test.com', password='password1')
+        cls.other = User.objects.create_user(username='Uncached', email='uncached@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard Plan', price=10)
+        cls.app = App.objects.create(name='Cached App', description='Cached', type='ty1', framework='fw1',
+                                     user=cls.user)
+        cls.sub = Subscription.objects.create(user=cls.user, plan=cls.plan, app=cls.app, active=True)
+
+    def setUp(self):
+        cache.clear()
+        # The tests run on the local-memory cache, where it is off by default.
+        patcher = mock.patch.object(response_cache, 'ttl', 300)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(user=self.user)
+
+    def test_repeated_list_is_served_from_cache(self):
+        url = reverse('apps-list')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.data, first.data)
+
+    def test_entries_are_per_user(self):
+        url = reverse('subscriptions-list')
+        self.assertEqual(len(self.client.get(url).data['results']), 1)
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get(url).data['results'], [])
+
+    def test_write_bumps_user_version(self):
+        url = reverse('apps-detail', kwargs={'pk': self.app.id})
+        version = response_cache.version(self.user.id)
+        self.client.get(url)
+        self.client.patch(url, {'description': 'Changed'}, format='json')
+        self.assertNotEqual(response_cache.version(self.user.id), version)
+        self.assertEqual(self.client.get(url).data[0]['description'], 'Changed')
+
+    def test_bulk_write_bumps_user_version(self):
+        url = reverse('subscriptions-list')
+        self.client.get(url)
+        response = self.client.post(reverse('subscriptions-bulk'), [
+            {'id': self.sub.id, 'user': self.user.id, 'active': False},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(self.client.get(url).data['results'][0]['active'])
+
+    def test_plan_change_invalidates_expanded_subscriptions(self):
+        url = reverse('subscriptions-list') + '?expand=plan'
+        self.client.get(url)
+        self.plan.description = 'Renamed'
+        self.plan.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['plan']['description'], 'Renamed')
+
+    def test_file_backend(self):
+        url = reverse('apps-list')
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+
+    def test_process_local_cache_warning(self):
+        with override_settings(API_RESPONSE_CACHE_TTL=300):
+            self.assertEqual([w.id for w in check_response_cache_backend(None)], ['home.W001'])
+        with override_settings(API_RESPONSE_CACHE_TTL=0):
+            self.assertEqual(check_response_cache_backend(None), [])
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlight('test', wait_timeout=2, poll_interval=0.01)
+
+    def run_leader(self, results, compute):
+        leader = threading.Thread(target=lambda: results.append(self.flight.do('key', compute)))
+        leader.start()
+        return leader
+
+    def test_concurrent_callers_share_one_computation(self):
+        started, release, calls, results = threading.Event(), threading.Event(), [], []
+
+        def compute():
+            started.set()
+            release.wait(2)
+            calls.append(1)
+            return 'value'
+
+        threads = [self.run_leader(results, compute)]
+        started.wait(2)
+        for _ in range(5):
+            threads.append(self.run_leader(results, compute))
+        while self.flight.local['coalesced'] < 5:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['value'] * 6)
+        self.assertEqual(self.flight.stats()['coalesced'], 5)
+
+    def test_stale_value_served_during_recompute(self):
+        started, release, results = threading.Event(), threading.Event(), []
+        leader = self.run_leader(results, lambda: started.set() or release.wait(2) and 'new')
+        started.wait(2)
+        self.assertEqual(self.flight.do('key', lambda: 'unused', stale='old'), 'old')
+        release.set()
+        leader.join()
+        self.assertEqual(results, ['new'])
+        self.assertEqual(self.flight.local['stale'], 1)
+
+    def test_other_process_holding_the_lock(self):
+        cache.add('singleflight:test:lock:key', 1)
+        self.assertEqual(self.flight.do('key', lambda: 'computed', stale='old', shared=True), 'old')
+
+        threading.Timer(0.05, lambda: cache.set('value', 'theirs')).start()
+        result = self.flight.do('key', lambda: 'computed', lookup=lambda: cache.get('value'), shared=True)
+        self.assertEqual(result, 'theirs')
+        self.assertEqual(self.flight.stats()['lock_waits'], 1)
+
+    def test_lock_wait_times_out(self):
+        self.flight.wait_timeout = 0.05
+        cache.add('singleflight:test:lock:key', 1)
+        self.assertEqual(self.flight.do('key', lambda: 'computed', lookup=lambda: None, shared=True), 'computed')
+        self.assertEqual(self.flight.stats()['timeouts'], 1)
+
+    def test_error_is_shared_and_not_cached(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.flight.do('key', lambda: 1 / 0)
+        self.assertEqual(self.flight.do('key', lambda: 'ok'), 'ok')
+
+    def test_stats_command(self):
+        self.flight.do('key', lambda: 'value')
+        out = StringIO()
+        call_command('singleflight_stats', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('flight'))
+        self.assertIn(['test', '1', '0', '0', '0', '0'], [line.split() for line in lines])
+
+
+class StaleResponseTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Stale', email='stale@test.com', password='password1')
+        App.objects.create(name='Stale App', description='Stale', type='ty1', framework='fw1', user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        # The tests run on the local-memory cache, where it is off by default.
+        patcher = mock.patch.object(response_cache, 'ttl', 300)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(user=self.user)
+        # Past the entries' freshness but within their stale period.
+        self.later = time.time() + response_cache.ttl + response_cache.stale_ttl / 2
+
+    def test_expired_entry_is_served_while_another_process_refreshes(self):
+        url = reverse('apps-list')
+        first = self.client.get(url)
+        with mock.patch('time.time', return_value=self.later), \
+                mock.patch.object(response_cache.flight.cache, 'add', return_value=False):
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+
+    def test_expired_entry_is_refreshed(self):
+        url = reverse('apps-list')
+        self.client.get(url)
+        App.objects.filter(user=self.user).update(description='Out of band')
+        with mock.patch('time.time', return_value=self.later):
+            response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['description'], 'Out of band')
+
+
+@skipUnless(renderers.orjson and renderers.msgpack, 'orjson and msgpack are not installed')
+class RendererTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Packed', email='packed@test.com', password='password1')
+        cls.plan = Plan.objects.create(name='Std', description='Standard   Plan ✓', price='10.50')
+        cls.app = App.objects.create(name='Packed App', description='Packed', type='ty1', framework='fw1',
+                                     user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_orjson_output_matches_drf(self):
+        data = {
+            'plans': PlanSerializer(Plan.objects.all(), many=True).data,
+            'price': Decimal('10.50'),
+            'when': timezone.now(),
+            1: None,
+        }
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_msgpack_negotiated(self):
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        body = msgpack.unpackb(response.content, raw=False)
+        self.assertEqual(body['results'][0]['name'], 'Packed App')
+
+        json_response = self.client.get(reverse('apps-list'))
+        self.assertEqual(body, json.loads(json_response.content))
+
+    def test_msgpack_request_body(self):
+        body = msgpack.packb([{'user': self.user.id, 'plan': self.plan.id, 'app': self.app.id}])
+        response = self.client.post(reverse('subscriptions-bulk'), body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_invalid_bodies(self):
+        url = reverse('subscriptions-bulk')
+        for body, content_type in ((b'{"user": ', 'application/json'), (b'\xc1', 'application/msgpack')):
+            response = self.client.post(url, body, content_type=content_type)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class APICompressionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Zipper', email='zip@test.com', password='password1')
+        for i in range(20):
+            App.objects.create(name=f'Zipped {i}', description='Compressible ' * 10, type='ty1',
+                               framework='fw1', user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_gzip(self):
+        plain = self.client.get(reverse('apps-list'))
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+    def test_weak_etag_still_validates(self):
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT_ENCODING='gzip')
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @skipUnless(middleware.brotli, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        plain = self.client.get(reverse('apps-list'))
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), plain.content)
+
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_skips_small_and_refused(self):
+        App.objects.exclude(name='Zipped 0').delete()
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary') and 'Accept-Encoding' in response['Vary'])
+
+        cache.clear()
+        App.objects.all().delete()
+        response = self.client.get(reverse('apps-list'), HTTP_ACCEPT_ENCODING='identity, *;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(API_COMPRESSION_MIN_SIZE=0)
+    def test_streaming(self):
+        plain = b''.join(self.client.get(reverse('apps-export')).streaming_content)
+        response = self.client.get(reverse('apps-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    def test_middleware_scope(self):
+        get_response = mock.Mock(return_value=HttpResponse(b'x' * 4096, content_type='text/plain'))
+        compress = middleware.APICompressionMiddleware(get_response)
+        request = RequestFactory().get('/accounts/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(compress(request).has_header('Content-Encoding'))
+
+        request = RequestFactory().get('/api/v1/apps/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress(request)['Content-Encoding'], 'gzip')
+
+        for response in (HttpResponse(b'x' * 4096, content_type='image/png'),
+                         HttpResponse(b'x' * 4096, content_type='application/json', status=204)):
+            get_response.return_value = response
+            self.assertFalse(compress(request).has_header('Content-Encoding'))
+
+        encoded = HttpResponse(gzip.compress(b'x' * 4096), content_type='application/json')
+        encoded['Content-Encoding'] = 'gzip'
+        get_response.return_value = encoded
+        self.assertEqual(compress(request).content, encoded.content)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(middleware.accepted_encodings('gzip;q=0.5, BR , *;q=0, x;q=oops'),
+                         {'gzip': 0.5, 'br': 1.0, '*': 0.0})
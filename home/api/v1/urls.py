@@ -7,6 +7,7 @@ from home.api.v1.viewsets import (
     PlanViewSet,
     SubscriptionViewSet,
     AppViewSet,
+    DatabasePoolViewSet,
 )
 
 router = DefaultRouter()
@@ -15,6 +16,7 @@ router.register("login", LoginViewSet, basename="login")
 router.register("plans", PlanViewSet, basename="plans")
 router.register("subscriptions", SubscriptionViewSet, basename="subscriptions")
 router.register("apps", AppViewSet, basename="apps")
+router.register("db-pool", DatabasePoolViewSet, basename="db-pool")
 
 urlpatterns = [
     path("", include(router.urls)),
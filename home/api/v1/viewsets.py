@@ -1,11 +1,26 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet, ViewSet, ReadOnlyModelViewSet
 from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import permissions, status
+from rest_framework.exceptions import NotFound, ParseError
 from subscriptions.models import Plan, Subscription
 from apps.models import App
 from users.models import User
+from home.api.v1.bulk import BulkError, bulk_upsert_subscriptions, delete_apps, import_apps
+from home.api.v1.conditional import ConditionalGet
+from home.api.v1.fastserializers import ValuesSerializer
+from home.api.v1.filters import app_filter, subscription_filter
+from home.api.v1.ndjson import CONTENT_TYPE as NDJSON_CONTENT_TYPE, NDJSONRenderer, dump_lines
+from home.api.v1.ownership import app_ownership
+from home.api.v1.pagination import KeysetPagination
+from home.api.v1.plan_catalog import add_cache_control, plan_catalog
+from home.api.v1.response_cache import response_cache
+from home.db.pool import pool_stats
 
 from home.api.v1.serializers import (
     SignupSerializer,
@@ -39,31 +54,138 @@ class LoginViewSet(ViewSet):
 class PlanViewSet(ReadOnlyModelViewSet):
     queryset = Plan.objects.all()
     serializer_class = PlanSerializer
+    fast_read = True
 
-def get_user_from_request(request):
-    key = request.META.get('HTTP_AUTHORIZATION')
+    def list(self, request, *args, **kwargs):
+        if plan_catalog.serves(request):
+            return plan_catalog.response(request, 'list', lambda: self.render_catalog(
+                request, Plan.objects.all(), many=True))
 
-    if key:
-        keyTok = key.split()
-        tokenObj = Token.objects.get(key=keyTok[1])
-        user = tokenObj.user.id
-    else:
-        user = request.user.id
-    return user
+        options = get_read_options(request, PlanSerializer)
+        plans = self.queryset.all()
+        return conditional_read(request, plans, options, lambda: Response(
+            serialize_page(self, plans, PlanSerializer, options)), collection=True)
 
-def is_user_authorized_for_app(appInfo, usr):
+    def retrieve(self, request, *args, **kwargs):
+        # Keyed on the id as a number, so /plans/01/ and /plans/1/ share an
+        # entry rather than each adding a copy.
+        try:
+            pk = int(kwargs['pk'])
+        except ValueError:
+            raise NotFound()
+        if plan_catalog.serves(request):
+            return plan_catalog.response(request, pk, lambda: self.render_catalog(
+                request, [self.get_object()]))
+
+        plans = self.queryset.filter(pk=kwargs['pk'])
+        return conditional_read(request, plans, {}, lambda: super(PlanViewSet, self).retrieve(
+            request, *args, **kwargs))
+
+    def render_catalog(self, request, plans, many=False):
+        plans = list(plans)
+        data = PlanSerializer(plans if many else plans[0], many=many).data
+        # As for other lists, no Last-Modified: deletions don't move it.
+        last_modified = None if many else plans[0].updated_at
+        content = request.accepted_renderer.render(data, request.accepted_media_type)
+        return data, content, last_modified
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return add_cache_control(response)
 
-    userApps = App.objects.filter(user=usr)
+    def get_queryset(self):
+        self.read_options = get_read_options(self.request, PlanSerializer)
+        return plan_read_queryset(super().get_queryset(), PlanSerializer, self.read_options)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(getattr(self, 'read_options', {}))
+        return super().get_serializer(*args, **kwargs)
+
+def serialize_page(view, queryset, serializer_class, options):
+    """
+    Paginate and serialize a list, through the compiled `.values_list()`
+    path when the view enables `fast_read` and the options allow it.
+    """
+    paginator = view.paginator
+    required = [paginator.get_ordering(view.request, view)[0]] if paginator else []
+
+    fast = view.fast_read and ValuesSerializer.for_serializer(serializer_class, **options)
+    if fast:
+        queryset = fast.queryset(queryset, extra=required)
+    else:
+        queryset = plan_read_queryset(queryset, serializer_class, options, required=required)
+
+    page = view.paginate_queryset(queryset)
+    if page is None:
+        page = queryset
+    if fast:
+        return fast.serialize(page)
+    return serializer_class(page, many=True, **options).data
+
+def conditional_read(request, queryset, options, build_response, collection=False):
+    """
+    Serve a read with ETag / Last-Modified validators (ETag only for a
+    `collection`), answering 304 before `build_response` runs when the
+    client's copy is current.
+    """
+    relations = options.get('expand', ())
+    if not ConditionalGet.supports(queryset.model, relations):
+        return build_response()
+    conditional = ConditionalGet(request, queryset, relations, collection=collection)
+    return conditional.not_modified(request) or conditional.apply(build_response())
 
-    for obj in userApps:
-        if str(obj.id) == appInfo:
-            return True
-    return False
+def get_user_from_request(request):
+    # The views using this require IsAuthenticated, so DRF authentication
+    # (TokenAuthentication: one query joining the user) has resolved the user.
+    return request.user.id
+
+def is_user_authorized_for_app(appInfo, usr):
+    return app_ownership.is_owner(usr, appInfo)
+
+def split_query_param(request, name):
+    return [f.strip() for f in request.query_params.get(name, '').split(',') if f.strip()]
+
+def get_read_options(request, serializer_class):
+    """
+    Parse `?fields=`, `?omit=` and `?expand=` into serializer kwargs,
+    rejecting names the serializer does not know.
+    """
+    options = {}
+    fields = split_query_param(request, 'fields')
+    omit = split_query_param(request, 'omit')
+    unknown = (set(fields) | set(omit)) - set(serializer_class().fields)
+
+    expandable = getattr(serializer_class, 'expandable_fields', None)
+    if expandable is not None:
+        options['expand'] = split_query_param(request, 'expand')
+        unknown |= set(options['expand']) - set(expandable)
+
+    if unknown:
+        raise ParseError('Unknown field(s): ' + ', '.join(sorted(unknown)))
+    if fields:
+        options['fields'] = fields
+    if omit:
+        options['omit'] = omit
+    return options
+
+def plan_read_queryset(queryset, serializer_class, options, required=()):
+    """Fetch only the columns and relations the narrowed serializer reads."""
+    serializer = serializer_class(**options)
+    model_fields = {f.name for f in queryset.model._meta.concrete_fields}
+    columns = {f.source for f in serializer.fields.values() if f.source in model_fields}
+    related = [name for name in options.get('expand', ()) if name in serializer.fields]
+    if related:
+        # select_related() with no names would join every non-null foreign key.
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns, *required)
 
 class SubscriptionViewSet(ModelViewSet):
 
     serializer_class = SubscriptionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    ordering_fields = ('created_at', 'updated_at', 'id')
+    fast_read = True
 
     def get_queryset(self):
         subs = Subscription.objects.all()
@@ -72,18 +194,23 @@ class SubscriptionViewSet(ModelViewSet):
     def list(self, request, *args, **kwargs):
         try:
             usr = get_user_from_request(request)
-            subs = Subscription.objects.filter(user=usr)
-            serializer = SubscriptionSerializer(subs, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            options = get_read_options(request, SubscriptionSerializer)
+            subs = subscription_filter.filter_queryset(request, Subscription.objects.filter(user=usr))
+            return response_cache.response(self, request, usr, lambda: conditional_read(
+                request, subs, options, lambda: self.get_paginated_response(
+                    serialize_page(self, subs, SubscriptionSerializer, options)), collection=True))
         except Exception as e:
             return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
 
     def retrieve(self, request, *args, **kwargs):
         try:
             usr = get_user_from_request(request)
+            options = get_read_options(request, SubscriptionSerializer)
             subs = Subscription.objects.filter(user=usr, id=kwargs['pk'])
-            serializer = SubscriptionSerializer(subs, many=True)
-            return Response(serializer.data, status.HTTP_200_OK)
+            return response_cache.response(self, request, usr, lambda: conditional_read(
+                request, subs, options, lambda: Response(SubscriptionSerializer(
+                    plan_read_queryset(subs, SubscriptionSerializer, options), many=True, **options
+                ).data, status.HTTP_200_OK)))
         except Exception as e:
             return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -151,30 +278,60 @@ class SubscriptionViewSet(ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """Create and/or update a list of subscriptions in one transaction."""
+        try:
+            usr = get_user_from_request(request)
+            items = request.data
+            if not isinstance(items, list) or not items:
+                return Response({'error': 'Expected a non-empty list of subscriptions'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if len(items) > settings.API_MAX_PAGE_SIZE:
+                return Response({'error': f'At most {settings.API_MAX_PAGE_SIZE} subscriptions per request'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            subs, created, updated = bulk_upsert_subscriptions(usr, items)
+            serializer = SubscriptionSerializer(subs, many=True)
+            return Response({'created': created, 'updated': updated, 'results': serializer.data},
+                            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+        except BulkError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
+
 class AppViewSet(ModelViewSet):
 
     queryset = App.objects.all()
     serializer_class = AppSerializer
+    pagination_class = KeysetPagination
+    ordering_fields = ('created_at', 'updated_at', 'name', 'id')
+    fast_read = True
 
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
         try:
             usr = get_user_from_request(request)
-            apps = App.objects.filter(user=usr)
-            serializer = AppSerializer(apps, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            options = get_read_options(request, AppSerializer)
+            apps = app_filter.filter_queryset(request, App.objects.filter(user=usr))
+            return response_cache.response(self, request, usr, lambda: conditional_read(
+                request, apps, options, lambda: self.get_paginated_response(
+                    serialize_page(self, apps, AppSerializer, options)), collection=True))
         except Exception as e:
             return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
 
     def retrieve(self, request, *args, **kwargs):
         try:
             usr = get_user_from_request(request)
+            options = get_read_options(request, AppSerializer)
             apps = App.objects.filter(user=usr, id=kwargs['pk'])
-            serializer = AppSerializer(apps, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return response_cache.response(self, request, usr, lambda: conditional_read(
+                request, apps, options, lambda: Response(AppSerializer(
+                    plan_read_queryset(apps, AppSerializer, options), many=True, **options
+                ).data, status=status.HTTP_200_OK)))
         except Exception as e:
-            return Response({'error' : e}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
 
     def create(self, request, *args, **kwargs):
         try:
@@ -219,18 +376,68 @@ class AppViewSet(ModelViewSet):
         except Exception as e:
             return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
 
-    def destroy(self, request, *args, **kwargs):
-        # Should all associated subscription set to inactive?
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, JSONRenderer])
+    def export(self, request, *args, **kwargs):
+        """Stream all of the user's apps as NDJSON, one app per line."""
         try:
             usr = get_user_from_request(request)
-            subs = Subscription.objects.filter(user=usr, app=kwargs['pk'])
-            for obj in subs:
-                obj.active = False
-                obj.save()
+            fast = ValuesSerializer.for_serializer(AppSerializer)
+            rows = fast.queryset(App.objects.filter(user=usr).order_by('id')).iterator(
+                chunk_size=settings.NDJSON_CHUNK_SIZE)
+            response = StreamingHttpResponse(dump_lines(fast.iterate(rows)), content_type=NDJSON_CONTENT_TYPE)
+            response['Content-Disposition'] = 'attachment; filename="apps.ndjson"'
+            return response
+        except Exception as e:
+            return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
 
-            apps = App.objects.get(user=usr, id=kwargs['pk'])
-            apps.delete()
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def import_(self, request, *args, **kwargs):
+        """Create apps from an NDJSON body, as produced by `export`."""
+        try:
+            usr = get_user_from_request(request)
+            if request.stream is None:
+                return Response({'error': 'Empty request body'}, status=status.HTTP_400_BAD_REQUEST)
+            created, errors = import_apps(usr, request.stream, settings.NDJSON_CHUNK_SIZE)
+            if errors:
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'created': created}, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
+
+    def destroy(self, request, *args, **kwargs):
+        # Associated subscriptions are set to inactive along with the delete.
+        try:
+            usr = get_user_from_request(request)
+            if not delete_apps(usr, [kwargs['pk']]):
+                return Response({'error': 'App matching query does not exist.'},
+                                status=status.HTTP_400_BAD_REQUEST)
 
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
-            return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete', url_name='bulk-delete')
+    def bulk_delete(self, request, *args, **kwargs):
+        """Delete many of the user's apps given as `{"ids": [...]}`."""
+        try:
+            usr = get_user_from_request(request)
+            ids = request.data.get('ids') if isinstance(request.data, dict) else None
+            if not isinstance(ids, list) or not ids:
+                return Response({'error': 'Expected a non-empty list of app ids'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > settings.API_MAX_PAGE_SIZE:
+                return Response({'error': f'At most {settings.API_MAX_PAGE_SIZE} apps per request'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            deleted = delete_apps(usr, [int(i) for i in ids])
+            return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({'error' : e.args}, status=status.HTTP_400_BAD_REQUEST)
+
+class DatabasePoolViewSet(ViewSet):
+    """Connection pool stats of the serving process, by database alias (staff only)."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response(pool_stats())
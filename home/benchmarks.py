@@ -0,0 +1,337 @@
+"""
+Micro-benchmarks run through `manage.py benchmark <name>`.
+
+Each benchmark is a function registered with `@benchmark(name)` that returns
+a list of result rows (dicts with the same keys) for the command to print.
+Benchmarks that need data create it inside a transaction that is rolled back.
+"""
+import socket
+import socketserver
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat):
+    """Run `func` `repeat` times and return the median wall time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def make_apps(user, count, batch_size=None):
+    from apps.models import App
+
+    App.objects.bulk_create(
+        (App(name=f'bench-{user.id}-{i}', description='Benchmark app', type='ty1',
+             framework='fw1', domain_name='bench.example.com', user=user)
+         for i in range(count)),
+        batch_size=batch_size,
+    )
+
+
+def make_user(username='benchmark'):
+    from users.models import User
+
+    return User.objects.create(username=username, email=f'{username}@example.com')
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of RFC 5321 for smtplib: no TLS, no AUTH."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.sockets.add(self.connection)
+        try:
+            # Stands in for the TCP + TLS + AUTH round trips of a real server.
+            time.sleep(server.connect_delay)
+            self.reply('220 localhost ESMTP')
+            data = None
+            for raw in self.rfile:
+                line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+                if data is not None:
+                    if line == '.':
+                        with server.lock:
+                            server.messages.append('\n'.join(data))
+                        data = None
+                        self.reply('250 OK')
+                    else:
+                        data.append(line[1:] if line.startswith('..') else line)
+                    continue
+                verb = line[:4].upper()
+                if verb in ('EHLO', 'HELO'):
+                    self.reply('250 localhost')
+                elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                    self.reply('250 OK')
+                elif verb == 'DATA':
+                    data = []
+                    self.reply('354 End data with <CR><LF>.<CR><LF>')
+                elif verb == 'QUIT':
+                    self.reply('221 Bye')
+                    return
+                else:
+                    self.reply('502 Command not implemented')
+        except OSError:
+            pass
+        finally:
+            with server.lock:
+                server.sockets.discard(self.connection)
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    An in-process SMTP sink on 127.0.0.1 for tests and benchmarks.
+
+    Counts connections and keeps received messages; `connect_delay` adds a
+    fixed cost to every new connection, like a real handshake would.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay=0):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connect_delay = connect_delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+        self.sockets = set()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop_connections(self):
+        """Close every open session from the server side, as an idle timeout would."""
+        with self.lock:
+            sockets = list(self.sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+
+
+@benchmark('serializers')
+def serializers_benchmark(rows=(10000, 100000), repeat=3):
+    """ModelSerializer vs the compiled `.values_list()` path for App lists."""
+    from apps.models import App
+    from home.api.v1.fastserializers import ValuesSerializer
+    from home.api.v1.serializers import AppSerializer
+    from rest_framework.renderers import JSONRenderer
+
+    results = []
+    for count in rows:
+        with rolled_back():
+            user = make_user()
+            make_apps(user, count)
+            queryset = App.objects.filter(user=user).order_by('created_at', 'id')
+            fast = ValuesSerializer.for_serializer(AppSerializer)
+
+            def model_path():
+                return AppSerializer(queryset.all(), many=True).data
+
+            def values_path():
+                return fast.serialize(fast.queryset(queryset.all()))
+
+            same = JSONRenderer().render(model_path()) == JSONRenderer().render(values_path())
+            baseline = measure(model_path, repeat)
+            for case, seconds in (('ModelSerializer', baseline),
+                                  ('ValuesSerializer', measure(values_path, repeat))):
+                results.append({
+                    'case': case,
+                    'rows': count,
+                    'median_ms': round(seconds * 1000, 1),
+                    'rows_per_s': int(count / seconds),
+                    'speedup': round(baseline / seconds, 2),
+                    'identical': same,
+                })
+    return results
+
+
+@benchmark('smtp')
+def smtp_benchmark(rows=(200,), repeat=3, connect_delay=0.01):
+    """
+    One `send_mail()` per message, as allauth sends them, through Django's SMTP
+    backend and the pooled backend, against a local server that charges
+    `connect_delay` seconds per new connection in place of a TLS handshake.
+    """
+    from django.core.mail import get_connection, send_mail
+    from home.smtp import SMTPPool
+
+    results = []
+    with LocalSMTPServer(connect_delay=connect_delay) as server:
+        options = {'host': '127.0.0.1', 'port': server.port, 'username': '', 'password': '',
+                   'use_tls': False, 'use_ssl': False}
+        for count in rows:
+            pool = SMTPPool()
+            backends = (
+                ('smtp.EmailBackend', lambda: get_connection(
+                    'django.core.mail.backends.smtp.EmailBackend', **options)),
+                ('PooledSMTPEmailBackend', lambda: get_connection(
+                    'home.smtp.PooledSMTPEmailBackend', pool=pool, **options)),
+            )
+            baseline = None
+            for case, connection in backends:
+                def send_all():
+                    pool.clear()
+                    for n in range(count):
+                        send_mail(f'Message {n}', 'Body', 'bench@example.com', ['to@example.com'],
+                                  connection=connection())
+
+                before = server.connections
+                seconds = measure(send_all, repeat)
+                baseline = baseline or seconds
+                results.append({
+                    'case': case,
+                    'messages': count,
+                    'median_ms': round(seconds * 1000, 1),
+                    'messages_per_s': int(count / seconds),
+                    'connections': (server.connections - before) // repeat,
+                    'speedup': round(baseline / seconds, 2),
+                })
+            pool.clear()
+    return results
+
+
+@benchmark('renderers')
+def renderers_benchmark(rows=(1000, 10000), repeat=5):
+    """DRF's JSONRenderer vs orjson vs MessagePack on app and subscription lists."""
+    import io
+
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from apps.models import App
+    from home.api.v1 import renderers
+    from home.api.v1.serializers import AppSerializer, SubscriptionSerializer
+    from subscriptions.models import Plan, Subscription
+
+    formats = [('JSONRenderer', JSONRenderer(), JSONParser())]
+    if renderers.orjson is not None:
+        formats.append(('ORJSONRenderer', renderers.ORJSONRenderer(), renderers.ORJSONParser()))
+    if renderers.msgpack is not None:
+        formats.append(('MessagePackRenderer', renderers.MessagePackRenderer(), renderers.MessagePackParser()))
+
+    results = []
+    for count in rows:
+        with rolled_back():
+            user = make_user()
+            make_apps(user, count)
+            plan = Plan.objects.create(name='Benchmark', description='Benchmark plan', price='9.99')
+            Subscription.objects.bulk_create(
+                Subscription(user=user, plan=plan, app_id=app_id, active=True)
+                for app_id in App.objects.filter(user=user).values_list('id', flat=True)
+            )
+            payloads = {
+                'apps': AppSerializer(App.objects.filter(user=user), many=True).data,
+                'subscriptions?expand=plan': SubscriptionSerializer(
+                    Subscription.objects.filter(user=user).select_related('plan'), many=True, expand=['plan'],
+                ).data,
+            }
+            for payload, data in payloads.items():
+                baseline = None
+                for case, renderer, parser in formats:
+                    content = renderer.render(data)
+                    render = measure(lambda: renderer.render(data), repeat)
+                    parse = measure(lambda: parser.parse(io.BytesIO(content)), repeat)
+                    baseline = baseline or render
+                    results.append({
+                        'payload': payload,
+                        'case': case,
+                        'rows': count,
+                        'render_ms': round(render * 1000, 2),
+                        'parse_ms': round(parse * 1000, 2),
+                        'bytes': len(content),
+                        'speedup': round(baseline / render, 2),
+                    })
+    return results
+
+
+def make_modules(modules_dir, count):
+    """A modules/ tree with `count` modules laid out like Crowdbotics ones."""
+    module_files = ['__init__.py', 'apps.py', 'admin.py', 'models.py', 'serializers.py', 'urls.py',
+                    'views.py', 'migrations/__init__.py', 'migrations/0001_initial.py',
+                    'templates/index.html', 'README.md']
+    paths = ['__init__.py', 'apps.py', 'migrations/__init__.py']
+    paths += [f'module_{n}/{file}' for n in range(count) for file in module_files]
+    for path in paths:
+        path = modules_dir / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+@benchmark('startup')
+def startup_benchmark(rows=(0, 10, 100), repeat=5):
+    """
+    Module discovery as done on every process start: the three `rglob()`
+    walks settings, `modules.urls` and `modules.admin` used to do, against
+    one scan and against reading the manifest written by
+    `build_module_manifest`.
+    """
+    import tempfile
+    from pathlib import Path
+
+    from modules.manifest import build_manifest, load_manifest, scan_modules
+
+    def rglob_walks(modules_dir):
+        return [list(modules_dir.rglob(name)) for name in ('apps.py', 'urls.py', 'admin.py')]
+
+    results = []
+    for count in rows:
+        with tempfile.TemporaryDirectory() as root:
+            modules_dir = Path(root) / 'modules'
+            make_modules(modules_dir, count)
+            manifest_path = Path(root) / 'manifest.json'
+            manifest = build_manifest(manifest_path, modules_dir)
+            same = load_manifest(manifest_path, modules_dir) == manifest == scan_modules(modules_dir)
+
+            baseline = None
+            for case, func in (('rglob x3', lambda: rglob_walks(modules_dir)),
+                               ('scan_modules', lambda: scan_modules(modules_dir)),
+                               ('load_manifest', lambda: load_manifest(manifest_path, modules_dir))):
+                seconds = measure(func, repeat)
+                baseline = baseline or seconds
+                results.append({
+                    'case': case,
+                    'modules': count,
+                    'median_ms': round(seconds * 1000, 3),
+                    'speedup': round(baseline / seconds, 1),
+                    'identical': same,
+                })
+    return results
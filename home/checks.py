@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_response_cache_backend(app_configs, **kwargs):
+    """The response cache needs every process to see the same version counters."""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.API_RESPONSE_CACHE_TTL and backend in settings.PROCESS_LOCAL_CACHES:
+        return [Warning(
+            'API_RESPONSE_CACHE_TTL is set but the default cache (%s) is local to each process.' % backend,
+            hint='Writes served by one process will not invalidate the responses cached by the '
+                 'others. Point CACHE_URL at a shared cache such as redis://, or set '
+                 'API_RESPONSE_CACHE_TTL=0 when running more than one process.',
+            id='home.W001',
+        )]
+    return []
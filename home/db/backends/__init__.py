@@ -0,0 +1,10 @@
+"""
+Pooled versions of the database backends in use (see `home.db.pool`).
+
+`POOLED_ENGINES` maps each supported Django ENGINE to its pooled wrapper.
+"""
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'home.db.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'home.db.backends.postgresql',
+    'django.db.backends.sqlite3': 'home.db.backends.sqlite3',
+}
@@ -0,0 +1,254 @@
+"""
+Per-process pool of database connections.
+
+With `DB_POOL` enabled the database ENGINE is swapped for one of the
+`home.db.backends` wrappers. Django still "closes" the connection of each
+thread at the end of every request (CONN_MAX_AGE = 0); the wrappers turn that
+into a check-in, and the next query of any thread checks a connection out
+again instead of connecting. This fits waitress, which serves requests from a
+fixed set of threads in one process: `DB_POOL_MAX_SIZE` should be at least its
+thread count, or requests queue for `DB_POOL_TIMEOUT` seconds.
+
+Connections idle for more than `DB_POOL_CHECK_AFTER` seconds are checked with
+`SELECT 1` before reuse, and any connection older than `DB_POOL_MAX_LIFETIME`
+is closed instead of being reused.
+"""
+import threading
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.db.utils import OperationalError
+
+POOLS = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class PooledConnection:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """At most `max_size` connections, idle or checked out, for one database."""
+
+    def __init__(self, max_size=10, timeout=5, max_lifetime=1800, check_after=5):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._idle = []
+        self._size = 0
+        self._condition = threading.Condition()
+        self.created = self.reused = self.discarded = self.recycled = 0
+        self.failed_checks = self.waits = self.timeouts = 0
+        self.wait_time = 0.0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=settings.DB_POOL_MAX_SIZE,
+            timeout=settings.DB_POOL_TIMEOUT,
+            max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+            check_after=settings.DB_POOL_CHECK_AFTER,
+        )
+
+    def expired(self, pooled):
+        return self.max_lifetime is not None and time.monotonic() - pooled.created > self.max_lifetime
+
+    def acquire(self, connect, healthy):
+        """
+        Check out an idle connection that passes `healthy(connection)`, or a
+        new one from `connect()`. Waits up to `timeout` seconds while the pool
+        is exhausted, then raises PoolTimeout.
+        """
+        while True:
+            pooled = self._take()
+            if pooled is None:
+                break
+            if self.expired(pooled):
+                with self._condition:
+                    self.recycled += 1
+                self.discard(pooled)
+                continue
+            if time.monotonic() - pooled.last_used > self.check_after and not healthy(pooled.connection):
+                with self._condition:
+                    self.failed_checks += 1
+                self.discard(pooled)
+                continue
+            with self._condition:
+                self.reused += 1
+            return pooled
+
+        try:
+            pooled = PooledConnection(connect())
+        except Exception:
+            self._release_slot()
+            raise
+        with self._condition:
+            self.created += 1
+        return pooled
+
+    def _take(self):
+        """Pop an idle connection, or reserve a slot for a new one (None)."""
+        with self._condition:
+            if not self._idle and self._size >= self.max_size:
+                self.waits += 1
+                start = time.monotonic()
+                available = self._condition.wait_for(
+                    lambda: self._idle or self._size < self.max_size, self.timeout)
+                self.wait_time += time.monotonic() - start
+                if not available:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'No database connection available within {self.timeout}s '
+                        f'({self.max_size} in use)')
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+            return None
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def release(self, pooled, reset):
+        """Check a connection back in; `reset(connection)` must leave it idle."""
+        if self.expired(pooled):
+            with self._condition:
+                self.recycled += 1
+            self.discard(pooled)
+            return
+        try:
+            reset(pooled.connection)
+        except Exception:
+            self.discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def discard(self, pooled):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self.discarded += 1
+        self._release_slot()
+
+    def clear(self):
+        """Close every idle connection; checked-out ones are closed on check-in."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self.discard(pooled)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'in_use': self._size - len(self._idle),
+                'idle': len(self._idle),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'recycled': self.recycled,
+                'failed_checks': self.failed_checks,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 6),
+                'timeouts': self.timeouts,
+            }
+
+
+def get_pool(key):
+    with _pools_lock:
+        pool = POOLS.get(key)
+        if pool is None:
+            pool = POOLS[key] = ConnectionPool.from_settings()
+        return pool
+
+
+def clear_pools():
+    """Close idle connections and forget every pool; the next checkout starts afresh."""
+    with _pools_lock:
+        pools = list(POOLS.values())
+        POOLS.clear()
+    for pool in pools:
+        pool.clear()
+
+
+def pool_stats():
+    """Stats of every pool in this process, by database alias."""
+    with _pools_lock:
+        pools = list(POOLS.items())
+    stats = {}
+    for (alias, _), pool in pools:
+        if alias in stats:
+            # Same alias with other parameters (e.g. before and after the test
+            # database was set up): add the counters up.
+            for name, value in pool.stats().items():
+                stats[alias][name] = value if name == 'max_size' else stats[alias][name] + value
+        else:
+            stats[alias] = pool.stats()
+    return stats
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mixed into a backend's DatabaseWrapper: `get_new_connection()` checks out
+    and `_close()` checks in. Each set of connection parameters gets its own
+    pool, so connections never leak between databases.
+    """
+
+    pooled = None
+
+    def pool_key(self, conn_params):
+        return self.alias, repr(sorted(conn_params.items()))
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        self.pool = get_pool(self.pool_key(conn_params))
+        self.pooled = self.pool.acquire(lambda: connect(conn_params), self.healthy)
+        return self.pooled.connection
+
+    def healthy(self, connection):
+        try:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute('SELECT 1')
+        except self.Database.Error:
+            return False
+        return True
+
+    @staticmethod
+    def reset(connection):
+        # Nothing may carry over to the next checkout: end any transaction
+        # (a no-op in autocommit mode).
+        connection.rollback()
+
+    def _close(self):
+        pooled, self.pooled = self.pooled, None
+        if pooled is None:
+            return super()._close()
+        if self.in_atomic_block:
+            # Closed mid-transaction (see BaseDatabaseWrapper.close()).
+            self.pool.discard(pooled)
+        else:
+            self.pool.release(pooled, self.reset)
+
+
+class PooledDatabaseCreationMixin:
+
+    def destroy_test_db(self, *args, **kwargs):
+        # Idle pooled connections would keep the test database in use.
+        self.connection.close()
+        clear_pools()
+        return super().destroy_test_db(*args, **kwargs)
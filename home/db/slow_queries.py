@@ -0,0 +1,210 @@
+"""
+Log of slow database statements.
+
+`install()` (run for every new connection, see home.signals) adds
+`log_slow_queries` to the connection's execute wrappers. Statements taking at
+least `SLOW_QUERY_THRESHOLD_MS` are appended as JSON lines to
+`SLOW_QUERY_LOG`: the SQL normalized (literals and placeholders replaced by
+`?`, lists of them collapsed), a fingerprint of it, the view being served
+(set by `SlowQueryViewMiddleware`) and how long it took. Parameters are not
+logged.
+
+The log is off unless `SLOW_QUERY_THRESHOLD_MS` is set, and `SLOW_QUERY_LOG`
+must be writable by the server process.
+
+Each fingerprint is EXPLAINed at most once per `SLOW_QUERY_EXPLAIN_INTERVAL`
+seconds per process (remembering the last `EXPLAINED_MAX_SIZE` ones), through
+a cursor that bypasses the execute wrappers: `EXPLAIN QUERY PLAN` on SQLite,
+`EXPLAIN` on PostgreSQL, or `EXPLAIN (ANALYZE, BUFFERS)` there with
+`SLOW_QUERY_EXPLAIN_ANALYZE`. ANALYZE runs the statement again, so it is only
+used for SELECTs. `manage.py slow_queries` summarizes the log.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_write_lock = threading.Lock()
+# When each (alias, fingerprint) was last EXPLAINed, least recent first.
+_explained = OrderedDict()
+_explained_lock = threading.Lock()
+EXPLAINED_MAX_SIZE = 1000
+
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r'\b\d+(?:\.\d+)?\b')
+_placeholder_re = re.compile(r'%s|\?')
+_list_re = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_repeated_list_re = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_space_re = re.compile(r'\s+')
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def normalize(sql):
+    """`sql` with literals and placeholders as `?` and lists of them as `(...)`."""
+    sql = _string_re.sub('?', sql)
+    sql = _number_re.sub('?', sql)
+    sql = _placeholder_re.sub('?', sql)
+    sql = _space_re.sub(' ', sql).strip()
+    sql = _list_re.sub('(...)', sql)
+    return _repeated_list_re.sub('(...)', sql)
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def set_view(name):
+    _local.view = name
+
+
+def current_view():
+    return getattr(_local, 'view', None)
+
+
+def explain(connection, sql, params, analyze=False):
+    """The plan of `sql` as text, or None if this backend or statement can't be explained."""
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif connection.vendor == 'postgresql':
+        select = sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze and select else 'EXPLAIN '
+    else:
+        return None
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+
+    # A failed statement aborts a PostgreSQL transaction; contain it.
+    savepoint = connection.vendor == 'postgresql' and connection.in_atomic_block
+    cursor = connection.create_cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+        except DatabaseError:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            logger.debug('Could not explain %s', sql, exc_info=True)
+            return None
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    finally:
+        cursor.close()
+
+    if connection.vendor == 'postgresql':
+        return '\n'.join(row[0] for row in rows)
+    # (id, parent, notused, detail): indent each step under its parent.
+    depths, lines = {0: -1}, []
+    for step, parent, _, detail in rows:
+        depths[step] = depths.get(parent, -1) + 1
+        lines.append('  ' * depths[step] + detail)
+    return '\n'.join(lines)
+
+
+def should_explain(key):
+    now = time.monotonic()
+    with _explained_lock:
+        last = _explained.get(key)
+        if last is not None and now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        _explained[key] = now
+        _explained.move_to_end(key)
+        while len(_explained) > EXPLAINED_MAX_SIZE:
+            _explained.popitem(last=False)
+    return True
+
+
+def write(entry):
+    # One line per write in append mode, so processes sharing the file don't
+    # interleave entries, and a rotated file is picked up on the next one.
+    line = json.dumps(entry) + '\n'
+    with _write_lock:
+        with open(settings.SLOW_QUERY_LOG, 'a') as f:
+            f.write(line)
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if not threshold:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < threshold:
+        return result
+
+    connection = context['connection']
+    normalized = normalize(sql)
+    key = fingerprint(normalized)
+    plan = None
+    if not many and should_explain((connection.alias, key)):
+        plan = explain(connection, sql, params, analyze=settings.SLOW_QUERY_EXPLAIN_ANALYZE)
+    entry = {
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration_ms, 3),
+        'fingerprint': key,
+        'sql': normalized,
+        'view': current_view(),
+        'alias': connection.alias,
+        'vendor': connection.vendor,
+        'explain': plan,
+    }
+    try:
+        write(entry)
+    except OSError:
+        logger.exception('Could not write to the slow query log %s', settings.SLOW_QUERY_LOG)
+    return result
+
+
+def install(connection):
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_slow_queries)
+
+
+def read_log(path):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # a line cut short by a crash
+    return entries
+
+
+Summary = namedtuple('Summary', ['fingerprint', 'count', 'total_ms', 'mean_ms', 'max_ms', 'views', 'sql', 'explain'])
+
+
+def summarize(entries, limit=None):
+    """Fingerprints by total time spent, with their views by count and the latest plan."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': {}, 'sql': entry['sql'], 'explain': None})
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        view = entry.get('view') or '-'
+        group['views'][view] = group['views'].get(view, 0) + 1
+        if entry.get('explain'):
+            group['explain'] = entry['explain']
+    summaries = [
+        Summary(key, g['count'], g['total_ms'], g['total_ms'] / g['count'], g['max_ms'],
+                sorted(g['views'], key=lambda v: -g['views'][v]), g['sql'], g['explain'])
+        for key, g in groups.items()
+    ]
+    summaries.sort(key=lambda s: -s.total_ms)
+    return summaries[:limit] if limit else summaries
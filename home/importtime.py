@@ -0,0 +1,133 @@
+"""
+Import cost of a cold start, measured with `python -X importtime`.
+
+`profile_imports()` starts a fresh interpreter that runs `django.setup()` and
+loads the URLconf, as a worker does before serving its first request, and
+parses the timings it prints. `manage.py import_profile` shows them per
+installed app, per top-level package or per module.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+
+Import = namedtuple('Import', ['name', 'depth', 'self_us', 'cumulative_us'])
+
+_line_re = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)\s*$')
+
+# `-X importtime` only times imports made by import statements / __import__,
+# not importlib.import_module(), which Django uses for the settings, apps and
+# URLconf. Route the latter through __import__ before Django is imported.
+CHILD_SCRIPT = """
+import importlib, json, resource, sys
+
+_import_module = importlib.import_module
+
+def import_module(name, package=None):
+    if name.startswith('.'):
+        return _import_module(name, package)
+    __import__(name)
+    return sys.modules[name]
+
+importlib.import_module = import_module
+
+import django
+django.setup()
+from django.conf import settings
+from django.urls import get_resolver
+get_resolver().url_patterns
+sys.stdout.write(json.dumps({
+    'installed_apps': list(settings.INSTALLED_APPS),
+    'root_urlconf': settings.ROOT_URLCONF,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+ImportProfile = namedtuple('ImportProfile', ['imports', 'installed_apps', 'root_urlconf', 'max_rss_kb'])
+
+Cost = namedtuple('Cost', ['self_us', 'cumulative_us', 'modules'])
+
+
+def parse_importtime(output):
+    """Parse `-X importtime` lines, in the order printed (children first)."""
+    imports = []
+    for line in output.splitlines():
+        match = _line_re.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append(Import(name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def profile_imports(settings_profile=None):
+    """Run a cold start in a subprocess and return its ImportProfile."""
+    env = dict(os.environ)
+    if settings_profile:
+        env['SETTINGS_PROFILE'] = settings_profile
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT],
+        cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=False,
+    )
+    if result.returncode:
+        lines = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError('\n'.join(lines[-20:]))
+    info = json.loads(result.stdout)
+    return ImportProfile(parse_importtime(result.stderr), info['installed_apps'], info['root_urlconf'],
+                         info['max_rss_kb'])
+
+
+def total_us(imports):
+    return sum(i.cumulative_us for i in imports if i.depth == 0)
+
+
+def _outermost(imports, matches):
+    """Imports matching `matches(name)` that were not imported by another match."""
+    found = []
+    # Children are printed before their parent, so walk backwards: a parent
+    # is then seen first and everything deeper that follows belongs to it.
+    inside = None
+    for i in reversed(imports):
+        if inside is not None and i.depth > inside:
+            continue
+        inside = None
+        if matches(i.name):
+            found.append(i)
+            inside = i.depth
+    return found
+
+
+def costs_by_prefix(imports, prefixes):
+    """
+    Cost of each dotted prefix (an app, a package): its modules' own import
+    time, and the cumulative time including everything they imported first.
+    """
+    costs = {}
+    for prefix in prefixes:
+        def matches(name):
+            return name == prefix or name.startswith(prefix + '.')
+
+        own = [i for i in imports if matches(i.name)]
+        costs[prefix] = Cost(sum(i.self_us for i in own),
+                             sum(i.cumulative_us for i in _outermost(imports, matches)), len(own))
+    return costs
+
+
+def app_costs(profile):
+    """Cost of each installed app (by its package) and of the URLconf, in INSTALLED_APPS order."""
+    modules = {app: app.split('.apps.')[0] for app in profile.installed_apps}
+    modules['urlconf'] = profile.root_urlconf
+    costs = costs_by_prefix(profile.imports, set(modules.values()))
+    return {label: costs[module] for label, module in modules.items()}
+
+
+def package_costs(profile):
+    """Cost of every top-level package."""
+    self_us = defaultdict(int)
+    for i in profile.imports:
+        self_us[i.name.split('.')[0]] += i.self_us
+    return costs_by_prefix(profile.imports, self_us)
@@ -0,0 +1,189 @@
+"""
+Durable outbox for outgoing e-mail.
+
+With `EMAIL_BACKEND = "home.mail.OutboxEmailBackend"`, sending mail (signup
+confirmation, password reset, ...) only writes `home.OutboxMessage` rows in
+the request's transaction and queues a `deliver_outbox` task. The worker
+(`manage.py runworker`) then sends the messages in batches through
+`OUTBOX_DELIVERY_BACKEND`, retrying failures with backoff.
+"""
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from home.models import OutboxMessage, Task
+from home.tasks import claim_rows, enqueue, retry_delay, task
+
+logger = logging.getLogger(__name__)
+
+
+def to_outbox(message):
+    """Return an unsaved OutboxMessage for `message`, or None if it can't be stored."""
+    html = [content for content, mimetype in getattr(message, 'alternatives', ()) if mimetype == 'text/html']
+    if message.attachments or len(html) != len(getattr(message, 'alternatives', ())) or len(html) > 1:
+        return None
+    return OutboxMessage(
+        subject=message.subject,
+        body=message.body,
+        html_body=html[0] if html else '',
+        from_email=message.from_email,
+        to=json.dumps(list(message.to)),
+        cc=json.dumps(list(message.cc)),
+        bcc=json.dumps(list(message.bcc)),
+        reply_to=json.dumps(list(message.reply_to)),
+        headers=json.dumps(message.extra_headers),
+    )
+
+
+def from_outbox(row):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        to=json.loads(row.to),
+        cc=json.loads(row.cc),
+        bcc=json.loads(row.bcc),
+        reply_to=json.loads(row.reply_to),
+        headers=json.loads(row.headers),
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, 'text/html')
+    return message
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """
+    Stores messages for background delivery instead of sending them.
+
+    Messages the outbox can't represent (attachments, non-HTML alternatives)
+    are handed straight to the delivery backend.
+    """
+
+    def send_messages(self, email_messages):
+        rows, direct = [], []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            row = to_outbox(message)
+            if row is None:
+                direct.append(message)
+            else:
+                rows.append(row)
+        if rows:
+            OutboxMessage.objects.bulk_create(rows)
+            schedule_delivery()
+        sent = len(rows)
+        if direct:
+            connection = get_connection(settings.OUTBOX_DELIVERY_BACKEND, fail_silently=self.fail_silently)
+            sent += connection.send_messages(direct) or 0
+        return sent
+
+
+def schedule_delivery(delay=0):
+    """Queue a `deliver_outbox` run unless one is already due within `delay`."""
+    due = timezone.now() + timedelta(seconds=delay)
+    pending = Task.objects.filter(name=deliver_outbox.task_name, status=Task.QUEUED, run_at__lte=due)
+    if not pending.exists():
+        enqueue(deliver_outbox, delay=delay)
+
+
+def deliverable(now):
+    stale = now - timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT)
+    return OutboxMessage.objects.filter(
+        Q(status=OutboxMessage.QUEUED, send_after__lte=now)
+        | Q(status=OutboxMessage.SENDING, updated_at__lt=stale)
+    ).order_by('send_after', 'id')
+
+
+def deliver_batch(connection, batch_size):
+    """Send one batch over `connection`; returns `(claimed, sent, failed)`."""
+    now = timezone.now()
+    rows = claim_rows(
+        deliverable(now), batch_size, guard=('status', 'updated_at'),
+        status=OutboxMessage.SENDING, updated_at=now,
+    )
+    sent = failed = 0
+    for row in rows:
+        row.attempts += 1
+        try:
+            connection.send_messages([from_outbox(row)])
+        except Exception as e:
+            failed += 1
+            row.last_error = f'{type(e).__name__}: {e}'
+            if row.attempts < settings.OUTBOX_MAX_ATTEMPTS:
+                row.status = OutboxMessage.QUEUED
+                row.send_after = timezone.now() + timedelta(seconds=retry_delay(row.attempts))
+            else:
+                row.status = OutboxMessage.FAILED
+            logger.warning('Outbox message %s failed, attempt %s: %s', row.id, row.attempts, row.last_error)
+        else:
+            sent += 1
+            row.status = OutboxMessage.SENT
+            row.sent_at = timezone.now()
+            row.last_error = ''
+        row.save(update_fields=['status', 'attempts', 'send_after', 'last_error', 'sent_at', 'updated_at'])
+    return len(rows), sent, failed
+
+
+@task
+def deliver_outbox(batch_size=None):
+    """
+    Send queued outbox messages in batches over one backend connection until
+    none are due, then schedule a follow-up run for any deferred retries.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    connection = get_connection(settings.OUTBOX_DELIVERY_BACKEND, fail_silently=False)
+    started = time.perf_counter()
+    total_sent = total_failed = 0
+    connection.open()
+    try:
+        while True:
+            claimed, sent, failed = deliver_batch(connection, batch_size)
+            total_sent += sent
+            total_failed += failed
+            if claimed < batch_size:
+                break
+    finally:
+        connection.close()
+    if total_sent or total_failed:
+        logger.info(
+            'Outbox: sent %s, failed %s in %.0fms', total_sent, total_failed,
+            (time.perf_counter() - started) * 1000,
+        )
+
+    retry = OutboxMessage.objects.filter(status=OutboxMessage.QUEUED).order_by('send_after').first()
+    if retry is not None:
+        schedule_delivery(max((retry.send_after - timezone.now()).total_seconds(), 0))
+    return total_sent
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def outbox_stats(window=1000):
+    """Counts per status plus delivery latency over the last `window` sent messages."""
+    counts = dict.fromkeys(dict(OutboxMessage.STATUS_CHOICES), 0)
+    for status, count in OutboxMessage.objects.order_by().values_list('status').annotate(Count('id')):
+        counts[status] = count
+    recent = OutboxMessage.objects.filter(status=OutboxMessage.SENT).order_by('-sent_at')[:window]
+    latencies = sorted(
+        (sent_at - created_at).total_seconds()
+        for created_at, sent_at in recent.values_list('created_at', 'sent_at')
+    )
+    return {
+        **counts,
+        'retried': OutboxMessage.objects.filter(attempts__gt=1).count(),
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p95': percentile(latencies, 0.95),
+        'latency_max': latencies[-1] if latencies else None,
+    }
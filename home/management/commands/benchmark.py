@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home.benchmarks import BENCHMARKS
+from home.management.utils import print_table
+
+
+class Command(BaseCommand):
+    help = "Run one of the registered performance benchmarks and print a table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(BENCHMARKS), help="Benchmark to run.")
+        parser.add_argument(
+            "--rows", dest="rows", type=int, nargs="+", default=None,
+            help="Row counts to benchmark with, where the benchmark supports it.",
+        )
+        parser.add_argument(
+            "--repeat", dest="repeat", type=int, default=3,
+            help="Number of timed runs per case; the median is reported.",
+        )
+
+    def handle(self, *args, **options):
+        kwargs = {"repeat": options["repeat"]}
+        if options["rows"]:
+            kwargs["rows"] = options["rows"]
+        try:
+            results = BENCHMARKS[options["name"]](**kwargs)
+        except TypeError as e:
+            raise CommandError(str(e))
+        if not results:
+            return
+
+        headers = list(results[0])
+        print_table([[row[h] for h in headers] for row in results], headers, self.stdout)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from modules import manifest
+
+
+class Command(BaseCommand):
+    help = "Scan modules/ and write modules/manifest.json, read at startup instead of scanning."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only verify that the manifest exists and is up to date; exit 1 if it is not.",
+        )
+
+    def handle(self, *args, **options):
+        path, modules_dir = manifest.MANIFEST_PATH, manifest.MODULES_DIR
+        if options["check"]:
+            current = manifest.load_manifest(path, modules_dir, scan=True) if path.exists() else None
+            if current != manifest.scan_modules(modules_dir):
+                raise CommandError(f"{path} is missing or out of date.")
+            self.stdout.write(f"{path} is up to date.")
+            return
+        built = manifest.build_manifest(path, modules_dir)
+        self.stdout.write(
+            f"Wrote {path}: {len(built['apps'])} app(s), "
+            f"{len(built['urls'])} url module(s), {len(built['admins'])} admin module(s)."
+        )
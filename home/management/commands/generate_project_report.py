@@ -1,27 +1,40 @@
 import json
-import subprocess
 
-import django
-from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from home.project_report import model_names, url_inventory
 
 
 class Command(BaseCommand):
     help = "Generate a json with all Models and URLs of the project."
 
-    def handle(self, *args, **options):
-        models = django.apps.apps.get_models(
-            include_auto_created=True, include_swapped=True
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--details", action="store_true",
+            help="Add the view class, permission classes and allowed methods of each URL.",
+        )
+        parser.add_argument(
+            "--probe", dest="probe", type=int, default=0, metavar="N",
+            help="GET each URL without parameters N times and add its status, median latency "
+                 "and query count.",
         )
-        cmd = "python3 manage.py show_urls --format=json"
-        loc = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE)
-        print(
-            json.dumps(
-                {
-                    "models": [
-                        str(model).split(".")[-1].replace("'", "").strip(">")
-                        for model in models
-                    ],
-                    "urls": json.loads(loc.stdout.decode().strip()),
-                }
-            )
+        parser.add_argument(
+            "--probe-user", dest="probe_user", default=None,
+            help="Username (or e-mail) to authenticate probes of API views as.",
         )
+        parser.add_argument("--indent", type=int, default=None, help="Indent the JSON output.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["probe_user"]:
+            User = get_user_model()
+            user = (User.objects.filter(username=options["probe_user"]).first()
+                    or User.objects.filter(email=options["probe_user"]).first())
+            if user is None:
+                raise CommandError(f"No user {options['probe_user']!r}")
+        report = {
+            "models": model_names(),
+            "urls": url_inventory(details=options["details"], probe_repeat=options["probe"], user=user),
+        }
+        self.stdout.write(json.dumps(report, indent=options["indent"]))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home.importtime import Cost, app_costs, package_costs, profile_imports, total_us
+from home.management.utils import print_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile a cold start (django.setup() and the URLconf) with `python -X importtime` and print "
+        "the import cost per installed app, top-level package or module, most expensive first. "
+        "Cumulative times include whatever was first imported on behalf of the app or package."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--by", choices=["app", "package", "module"], default="app",
+                            help="What to total import times by (default: app).")
+        parser.add_argument("--profile", choices=["full", "api"], default=None,
+                            help="SETTINGS_PROFILE to profile (default: the current one).")
+        parser.add_argument("--limit", type=int, default=30, help="Number of rows to print (0 for all).")
+
+    def handle(self, *args, **options):
+        try:
+            profile = profile_imports(options["profile"])
+        except RuntimeError as e:
+            raise CommandError(f"Profiled process failed:\n{e}")
+
+        if options["by"] == "app":
+            costs = app_costs(profile)
+        elif options["by"] == "package":
+            costs = package_costs(profile)
+        else:
+            costs = {i.name: Cost(i.self_us, i.cumulative_us, 1) for i in profile.imports}
+        rows = sorted(costs.items(), key=lambda item: item[1].cumulative_us, reverse=True)
+        if options["limit"]:
+            rows = rows[:options["limit"]]
+
+        print_table(
+            [[name, f"{cost.self_us / 1000:.1f}", f"{cost.cumulative_us / 1000:.1f}", cost.modules]
+             for name, cost in rows],
+            [options["by"], "self_ms", "cumulative_ms", "modules"],
+            self.stdout,
+        )
+        self.stdout.write(
+            f"\n{len(profile.imports)} modules imported in {total_us(profile.imports) / 1000:.1f}ms, "
+            f"max RSS {profile.max_rss_kb / 1024:.1f}MB, {len(profile.installed_apps)} installed apps"
+        )
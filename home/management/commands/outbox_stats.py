@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from home.mail import outbox_stats
+
+
+class Command(BaseCommand):
+    help = "Print outbox message counts and delivery latency (seconds)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window", dest="window", type=int, default=1000,
+            help="Number of most recently sent messages to compute latency over.",
+        )
+
+    def handle(self, *args, **options):
+        stats = outbox_stats(window=options["window"])
+        width = max(len(key) for key in stats)
+        for key, value in stats.items():
+            if isinstance(value, float):
+                value = f"{value:.3f}"
+            self.stdout.write(f"{key.ljust(width)}  {'-' if value is None else value}")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home.tasks import Worker
+
+
+def parse_queue(value):
+    name, _, concurrency = value.partition(":")
+    try:
+        concurrency = int(concurrency or 1)
+    except ValueError:
+        raise CommandError(f"Invalid concurrency in --queue {value!r}")
+    if not name or concurrency < 1:
+        raise CommandError(f"Invalid --queue {value!r}")
+    return name, concurrency
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks from the home.Task table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue", dest="queues", action="append", default=None,
+            help="Queue to work on as name[:threads]; may be repeated (default: default:1).",
+        )
+        parser.add_argument(
+            "--poll-interval", dest="poll_interval", type=float, default=1.0,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="Exit once the queues are drained instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        queues = dict(parse_queue(q) for q in options["queues"] or ["default"])
+        worker = Worker(queues, poll_interval=options["poll_interval"], burst=options["burst"])
+        self.stdout.write("Working on " + ", ".join(f"{q} ({n})" for q, n in queues.items()))
+        processed = worker.run()
+        self.stdout.write(f"Processed {processed} task(s)")
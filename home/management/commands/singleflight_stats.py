@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+# Importing the users of SingleFlight registers their flights.
+from home.api.v1 import plan_catalog, response_cache  # noqa F401
+from home.api.v1.singleflight import FLIGHTS
+from home.management.utils import print_table
+
+
+class Command(BaseCommand):
+    help = "Print single-flight (cache stampede) counters summed over all processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing.")
+
+    def handle(self, *args, **options):
+        headers = ["flight"] + list(next(iter(FLIGHTS.values())).counter_names)
+        rows = []
+        for name, flight in sorted(FLIGHTS.items()):
+            stats = flight.stats()
+            rows.append([name] + [stats[c] for c in flight.counter_names])
+            if options["reset"]:
+                flight.reset()
+        print_table(rows, headers, self.stdout)
@@ -0,0 +1,42 @@
+import os
+import textwrap
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from home.db.slow_queries import read_log, summarize
+from home.management.utils import print_table
+
+
+class Command(BaseCommand):
+    help = "Summarize the slow query log: statement fingerprints by total time spent."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=None, help="Log file to read (default: SLOW_QUERY_LOG).")
+        parser.add_argument("--limit", type=int, default=10, help="Number of fingerprints to show.")
+        parser.add_argument("--explain", action="store_true", help="Print the latest plan of each fingerprint.")
+        parser.add_argument("--width", type=int, default=80, help="Truncate SQL to this many characters.")
+
+    def handle(self, *args, **options):
+        path = options["log"] or settings.SLOW_QUERY_LOG
+        if not os.path.exists(path):
+            raise CommandError(f"No slow query log at {path}")
+        summaries = summarize(read_log(path), limit=options["limit"])
+        if not summaries:
+            self.stdout.write("No slow queries logged.")
+            return
+
+        rows = [
+            [
+                s.fingerprint, s.count, f"{s.total_ms:.1f}", f"{s.mean_ms:.1f}", f"{s.max_ms:.1f}",
+                ",".join(s.views[:3]) + (",..." if len(s.views) > 3 else ""),
+                textwrap.shorten(s.sql, options["width"], placeholder="..."),
+            ]
+            for s in summaries
+        ]
+        print_table(rows, ["fingerprint", "count", "total_ms", "mean_ms", "max_ms", "views", "sql"], self.stdout)
+
+        if options["explain"]:
+            for s in summaries:
+                self.stdout.write(f"\n{s.fingerprint}  {s.sql}")
+                self.stdout.write(textwrap.indent(s.explain or "(no plan captured)", "    "))
@@ -0,0 +1,6 @@
+def print_table(rows, headers, stdout):
+    """Write `rows` under `headers` to `stdout`, each column as wide as its widest cell."""
+    table = [[str(cell) for cell in line] for line in [headers, *rows]]
+    widths = [max(len(line[i]) for line in table) for i in range(len(headers))]
+    for line in table:
+        stdout.write("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip())
@@ -0,0 +1,285 @@
+"""
+Request metrics in the Prometheus text format.
+
+`RequestMetricsMiddleware` observes every request under `METRICS_PREFIXES`
+into per-view histograms kept in memory. Each process periodically writes a
+snapshot of them to `METRICS_DIR/<pid>.json` (every
+`METRICS_FLUSH_INTERVAL` seconds, atomically), and `/metrics` merges the
+snapshots of all processes sharing the directory. Without `METRICS_DIR` only
+the serving process is reported.
+
+Histograms of exited processes keep counting towards the totals, as
+Prometheus expects of counters; their gauges (e.g. pool connections in use)
+are dropped.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+
+class MetricsRegistry:
+    """Histogram values of this process: {name: {labels: [bucket counts..., +Inf count, sum]}}."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.collectors = []
+        self.values = {}
+        self._lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def histogram(self, name, documentation, labelnames, buckets=DURATION_BUCKETS):
+        histogram = self.histograms[name] = Histogram(name, documentation, labelnames, buckets)
+        self.values[name] = {}
+        return histogram
+
+    def collector(self, func):
+        """Register `func() -> [(name, type, documentation, {labels tuple: value})]`, run per snapshot."""
+        self.collectors.append(func)
+        return func
+
+    def observe(self, histogram, value, *labels):
+        index = bisect.bisect_left(histogram.buckets, value)
+        with self._lock:
+            series = self.values[histogram.name].get(labels)
+            if series is None:
+                series = self.values[histogram.name][labels] = [0] * (len(histogram.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def reset(self):
+        with self._lock:
+            for values in self.values.values():
+                values.clear()
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {name: [[list(labels), list(series)] for labels, series in values.items()]
+                          for name, values in self.values.items()}
+        collected = []
+        for collect in self.collectors:
+            for name, kind, documentation, values in collect():
+                collected.append([name, kind, documentation, [[list(k), v] for k, v in values.items()]])
+        return {'pid': os.getpid(), 'time': time.time(), 'histograms': histograms, 'collected': collected}
+
+    def flush(self, directory):
+        """Write this process's snapshot to `directory`, replacing the previous one atomically."""
+        os.makedirs(directory, exist_ok=True)
+        handle, path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(handle, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+        self.last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        directory = settings.METRICS_DIR
+        if directory and time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            try:
+                self.flush(directory)
+            except OSError:
+                # Never fail a request over metrics; retry after the interval.
+                self.last_flush = time.monotonic()
+                logger.exception('Could not write metrics to %s', directory)
+
+    def snapshots(self):
+        """Snapshots of every process, this one current."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return [self.snapshot()]
+        self.flush(directory)
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def exposition(self):
+        return render(self, self.snapshots())
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge(registry, snapshots):
+    histograms = {name: {} for name in registry.histograms}
+    collected = {}
+    for snapshot in snapshots:
+        for name, values in snapshot['histograms'].items():
+            if name not in histograms:
+                continue
+            for labels, series in values:
+                merged = histograms[name].setdefault(tuple(labels), [0] * len(series))
+                if len(merged) == len(series):
+                    histograms[name][tuple(labels)] = [a + b for a, b in zip(merged, series)]
+        if snapshot['pid'] != os.getpid() and not pid_alive(snapshot['pid']):
+            continue
+        for name, kind, documentation, values in snapshot['collected']:
+            metric = collected.setdefault(name, (kind, documentation, {}))[2]
+            for labels, value in values:
+                labels = tuple(tuple(pair) for pair in labels)
+                metric[labels] = metric.get(labels, 0) + value
+    return histograms, collected
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(registry, snapshots):
+    """Merge `snapshots` into the Prometheus text exposition format."""
+    histograms, collected = merge(registry, snapshots)
+    lines = []
+    for name, histogram in registry.histograms.items():
+        lines.append(f'# HELP {name} {histogram.documentation}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, series in sorted(histograms[name].items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else format_value(float(bound))
+                lines.append(f'{name}_bucket{format_labels(histogram.labelnames, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(histogram.labelnames, labels)} {format_value(series[-1])}')
+            lines.append(f'{name}_count{format_labels(histogram.labelnames, labels)} {cumulative}')
+    for name, (kind, documentation, values) in sorted(collected.items()):
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(values.items()):
+            names = [label for label, _ in labels]
+            lines.append(f'{name}{format_labels(names, [v for _, v in labels])} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Wall time of API requests.', ['view', 'method', 'status'])
+request_queries = registry.histogram(
+    'http_request_db_queries', 'Database queries per API request.', ['view', 'method'], QUERY_BUCKETS)
+request_db_duration = registry.histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per API request.', ['view', 'method'])
+request_serialize_duration = registry.histogram(
+    'http_request_serialize_duration_seconds',
+    'Time spent in serializers per API request, excluding the queries they run.', ['view', 'method'])
+request_render_duration = registry.histogram(
+    'http_request_render_duration_seconds', 'Time spent rendering (encoding) API responses.',
+    ['view', 'method'])
+
+
+@registry.collector
+def db_pool_metrics():
+    from home.db.pool import pool_stats
+
+    stats = pool_stats()
+    connections, waits, timeouts = {}, {}, {}
+    for alias, values in stats.items():
+        connections[(('alias', alias), ('state', 'in_use'))] = values['in_use']
+        connections[(('alias', alias), ('state', 'idle'))] = values['idle']
+        waits[(('alias', alias),)] = values['waits']
+        timeouts[(('alias', alias),)] = values['timeouts']
+    return [
+        ('db_pool_connections', 'gauge', 'Pooled database connections by state.', connections),
+        ('db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection.', waits),
+        ('db_pool_timeouts_total', 'counter', 'Checkouts that timed out waiting.', timeouts),
+    ]
+
+
+class RequestTimer:
+    """Per-request totals, fed by the execute wrapper, `serializing()` and the render callbacks."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.render_start = None
+        self._serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    @contextmanager
+    def serializing(self):
+        if self._serializing:  # a serializer used by another one
+            yield
+            return
+        self._serializing = True
+        start, db = time.perf_counter(), self.db
+        try:
+            yield
+        finally:
+            self._serializing = False
+            self.serialize += time.perf_counter() - start - (self.db - db)
+
+    def rendered(self, response):
+        if self.render_start is not None:
+            self.render += time.perf_counter() - self.render_start
+            self.render_start = None
+        return response
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} quer{"y" if self.queries == 1 else "ies"}"',
+            f'serialize;dur={self.serialize * 1000:.2f}',
+            f'render;dur={self.render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+def set_timer(timer):
+    _local.timer = timer
+
+
+def serializing():
+    """Count the enclosed block as serialization of the current request, if it is timed."""
+    timer = getattr(_local, 'timer', None)
+    return timer.serializing() if timer is not None else nullcontext()
@@ -0,0 +1,232 @@
+"""
+Compression and instrumentation of API responses.
+
+WhiteNoise pre-compresses static files, but JSON from the API goes out as is.
+`APICompressionMiddleware` gzips or brotli-compresses responses under
+`API_COMPRESSION_PREFIXES`, picking the encoding from Accept-Encoding. brotli
+is optional; without it only gzip is offered.
+"""
+import re
+import time
+import zlib
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from home import metrics
+from home.db import slow_queries
+from home.metrics import RequestTimer
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'application/msgpack',
+    'application/javascript', 'application/xml', 'text/',
+)
+
+_accept_encoding_re = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    encodings = {}
+    for part in header.split(','):
+        match = _accept_encoding_re.match(part)
+        if not match:
+            continue
+        try:
+            q = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        encodings[match.group(1).lower()] = q
+    return encodings
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        # wbits=31: zlib stream with a gzip header and trailer.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class APICompressionMiddleware:
+    """
+    Compress API responses for clients that accept gzip or br.
+
+    Skipped are responses below `API_COMPRESSION_MIN_SIZE` bytes, ones that
+    already have a Content-Encoding or a non-text content type (images,
+    archives, ...), and bodiless ones. Streaming responses (the NDJSON export)
+    are compressed on the fly, flushing every `API_COMPRESSION_STREAM_FLUSH`
+    bytes of input so clients still receive rows as they are produced.
+    Strong ETags become weak, as the body is no longer byte-identical.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(settings.API_COMPRESSION_PREFIXES)
+        self.min_size = settings.API_COMPRESSION_MIN_SIZE
+        self.gzip_level = settings.API_COMPRESSION_GZIP_LEVEL
+        self.brotli_quality = settings.API_COMPRESSION_BROTLI_QUALITY
+        self.stream_flush = settings.API_COMPRESSION_STREAM_FLUSH
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.path_info.startswith(self.prefixes):
+            self.process_response(request, response)
+        return response
+
+    def compressible(self, response):
+        if response.status_code in (204, 304) or response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.endswith('+json'):
+            return False
+        return response.streaming or len(response.content) >= self.min_size
+
+    def encoder(self, request):
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        wildcard = encodings.get('*', 0)
+        if brotli is not None and encodings.get('br', wildcard) > 0:
+            return BrotliEncoder(self.brotli_quality)
+        if encodings.get('gzip', wildcard) > 0:
+            return GzipEncoder(self.gzip_level)
+        return None
+
+    def process_response(self, request, response):
+        if not self.compressible(response):
+            return
+        # Whether or not this client gets it compressed, caches must key on it.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoder = self.encoder(request)
+        if encoder is None:
+            return
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(encoder, response.streaming_content)
+            del response['Content-Length']
+        else:
+            content = encoder.compress(response.content) + encoder.finish()
+            if len(content) >= len(response.content):
+                return
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoder.name
+
+    def compress_stream(self, encoder, chunks):
+        pending = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = encoder.compress(chunk)
+            pending += len(chunk)
+            if pending >= self.stream_flush:
+                data += encoder.flush()
+                pending = 0
+            if data:
+                yield data
+        yield encoder.finish()
+
+
+class RequestMetricsMiddleware:
+    """
+    Time requests under `METRICS_PREFIXES`: wall time, database queries (via
+    an execute wrapper on every connection), serializers (`.data` of the API
+    serializers and the compiled ValuesSerializer, see `metrics.serializing`)
+    and template/DRF rendering. The totals go into the histograms served at
+    /metrics and, with `METRICS_SERVER_TIMING`, into a Server-Timing header.
+    For streaming responses only the time until the first byte is measured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(settings.METRICS_PREFIXES)
+        self.server_timing = settings.METRICS_SERVER_TIMING
+
+    def __call__(self, request):
+        if not request.path_info.startswith(self.prefixes):
+            return self.get_response(request)
+
+        timer = request.request_timer = RequestTimer()
+        metrics.set_timer(timer)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            metrics.set_timer(None)
+        total = time.perf_counter() - timer.start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else '<unresolved>'
+        method = request.method
+        metrics.registry.observe(metrics.request_duration, total, view, method, str(response.status_code))
+        metrics.registry.observe(metrics.request_queries, timer.queries, view, method)
+        metrics.registry.observe(metrics.request_db_duration, timer.db, view, method)
+        metrics.registry.observe(metrics.request_serialize_duration, timer.serialize, view, method)
+        metrics.registry.observe(metrics.request_render_duration, timer.render, view, method)
+        metrics.registry.maybe_flush()
+
+        if self.server_timing:
+            response['Server-Timing'] = timer.server_timing(total)
+        return response
+
+    def process_template_response(self, request, response):
+        timer = getattr(request, 'request_timer', None)
+        if timer is not None:
+            timer.render_start = time.perf_counter()
+            response.add_post_render_callback(timer.rendered)
+        return response
+
+
+class SlowQueryViewMiddleware:
+    """Tell the slow query log (home.db.slow_queries) which view its statements come from."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_queries.set_view(None)
+        response = self.get_response(request)
+        # A streaming body still runs queries for its view while it is sent.
+        if not response.streaming:
+            slow_queries.set_view(None)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slow_queries.set_view(request.resolver_match.view_name)
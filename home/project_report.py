@@ -0,0 +1,143 @@
+"""
+Inventory of the project's models and URLs, built in-process.
+
+`url_inventory()` walks the root resolver the way django-extensions'
+`show_urls` does and lists the same url / module / name / decorators entries,
+optionally with the view class, permission classes and allowed methods of each
+view (`details`) and a test-client probe of parameterless GET URLs (`probe`).
+"""
+import functools
+import logging
+import statistics
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admindocs.views import simplify_regex
+from django.core.exceptions import ViewDoesNotExist
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIClient
+
+
+def model_names():
+    return [model.__name__ for model in apps.get_models(include_auto_created=True, include_swapped=True)]
+
+
+def walk(patterns, base='', namespace=None):
+    """Yield (callback, regex, name) for every URL below `patterns`."""
+    for p in patterns:
+        if isinstance(p, URLPattern):
+            try:
+                callback = p.callback
+            except ViewDoesNotExist:
+                continue
+            name = f'{namespace}:{p.name}' if p.name and namespace else p.name
+            yield callback, base + str(p.pattern), name
+        elif isinstance(p, URLResolver):
+            try:
+                children = p.url_patterns
+            except ImportError:
+                continue
+            if namespace and p.namespace:
+                child_namespace = f'{namespace}:{p.namespace}'
+            else:
+                child_namespace = p.namespace or namespace
+            yield from walk(children, base + str(p.pattern), child_namespace)
+
+
+def view_name(callback, checked=('login_required',)):
+    """Dotted view name and the names of `checked` found in the view's globals."""
+    decorators = [d for d in checked if d in getattr(callback, '__globals__', {})]
+    if isinstance(callback, functools.partial):
+        callback = callback.func
+        decorators.insert(0, 'functools.partial')
+    name = getattr(callback, '__name__', f'{type(callback).__name__}()')
+    return f'{callback.__module__}.{name}', ', '.join(decorators)
+
+
+def view_details(callback):
+    """View class, permission classes and allowed methods, where they can be told."""
+    cls = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    if cls is None:
+        return {'view_class': None, 'permission_classes': None, 'methods': None}
+
+    initkwargs = getattr(callback, 'initkwargs', {})
+    permissions = initkwargs.get('permission_classes', getattr(cls, 'permission_classes', None))
+    # ViewSets map HTTP methods to actions per route; other views by method name.
+    actions = getattr(callback, 'actions', None)
+    allowed = set(actions) if actions else {m for m in cls.http_method_names if hasattr(cls, m)}
+    allowed = {m for m in allowed if m in cls.http_method_names}
+    if 'get' in allowed and 'head' in cls.http_method_names:
+        allowed.add('head')
+    if 'options' in cls.http_method_names:
+        allowed.add('options')
+    return {
+        'view_class': f'{cls.__module__}.{cls.__qualname__}',
+        'permission_classes': None if permissions is None else [
+            f'{p.__module__}.{p.__qualname__}' for p in permissions],
+        'methods': sorted(m.upper() for m in allowed),
+    }
+
+
+def probe(client, url, repeat):
+    """GET `url` `repeat` times: status, median latency and the most queries of any run."""
+    timings, queries, status = [], 0, None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            try:
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            except Exception as e:
+                return {'status': None, 'error': repr(e)}
+            timings.append(time.perf_counter() - start)
+        queries = max(queries, len(captured))
+        status = response.status_code
+    return {'status': status, 'median_ms': round(statistics.median(timings) * 1000, 2), 'queries': queries}
+
+
+def probeable(url, details):
+    methods = details['methods']
+    return '<' not in url and (methods is None or 'GET' in methods)
+
+
+def url_inventory(details=False, probe_repeat=0, user=None):
+    """
+    List every URL of ROOT_URLCONF. With `probe_repeat`, parameterless URLs
+    that accept GET are requested that many times through the test client,
+    as `user` if given (authenticated for DRF views).
+    """
+    entries = []
+    client = None
+    if probe_repeat:
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user=user)
+
+    # Failed probes are part of the report; don't also log their tracebacks.
+    request_logger = logging.getLogger('django.request')
+    disabled, request_logger.disabled = request_logger.disabled, client is not None
+    try:
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            # show_urls looks for `--decorator` names (login_required) in the
+            # first view only: it then rebinds that list to the view's joined
+            # decorators, and checks each later view for that string's
+            # characters. Carried over the same way so the columns agree.
+            checked = ['login_required']
+            for callback, regex, name in walk(get_resolver().url_patterns):
+                url = simplify_regex(regex)
+                module, decorators = view_name(callback, checked)
+                checked = decorators
+                entry = {'url': url, 'module': module, 'name': name or '', 'decorators': decorators}
+                extra = view_details(callback)
+                if details:
+                    entry.update(extra)
+                if client is not None and probeable(url, extra):
+                    entry['probe'] = probe(client, url, probe_repeat)
+                entries.append(entry)
+    finally:
+        request_logger.disabled = disabled
+    return entries
@@ -0,0 +1,54 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.models import App
+from subscriptions.models import Plan, Subscription
+from users.models import User
+from home.api.v1.plan_catalog import plan_catalog
+from home.api.v1.response_cache import response_cache
+from home.db import slow_queries
+
+
+@receiver(connection_created)
+def install_slow_query_log(sender, connection, **kwargs):
+    slow_queries.install(connection)
+
+
+@receiver(post_init, sender=App)
+@receiver(post_init, sender=Subscription)
+def remember_owner(sender, instance, **kwargs):
+    # Read through __dict__ so a deferred user_id (.only()) isn't fetched.
+    instance._loaded_user_id = instance.__dict__.get('user_id')
+
+
+@receiver(post_save, sender=App)
+@receiver(post_delete, sender=App)
+def invalidate_app_responses(sender, instance, **kwargs):
+    response_cache.bump(instance.user_id)
+    if instance._loaded_user_id not in (None, instance.user_id):
+        response_cache.bump(instance._loaded_user_id)
+    instance._loaded_user_id = instance.user_id
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription_responses(sender, instance, **kwargs):
+    response_cache.bump(instance.user_id)
+    if instance._loaded_user_id not in (None, instance.user_id):
+        response_cache.bump(instance._loaded_user_id)
+    instance._loaded_user_id = instance.user_id
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_responses(sender, instance, **kwargs):
+    # Subscriptions can embed the user with ?expand=user.
+    response_cache.bump(instance.pk)
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def invalidate_plan_catalog(sender, instance, **kwargs):
+    plan_catalog.bump()
+    # Subscriptions of every user can embed plans with ?expand=plan.
+    response_cache.bump_all()
@@ -0,0 +1,216 @@
+"""
+SMTP e-mail backend that keeps authenticated connections open between sends.
+
+Django's SMTP backend connects, negotiates TLS and logs in for every
+`send_mail()` call. `PooledSMTPEmailBackend` instead takes a connection from
+a process-wide pool and hands it back afterwards. Connections that have been
+idle for a while are checked with NOOP before reuse, and are recycled after
+`EMAIL_POOL_MAX_MESSAGES` messages or `EMAIL_POOL_IDLE_TIMEOUT` seconds.
+"""
+import smtplib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail.backends import smtp
+from django.core.mail.message import sanitize_address
+
+
+class PooledConnection:
+
+    def __init__(self, key, connection):
+        self.key = key
+        self.connection = connection
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPPool:
+    """Idle SMTP connections grouped by server and credentials."""
+
+    def __init__(self, max_idle=4, idle_timeout=300, noop_after=30, max_messages=100):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.max_messages = max_messages
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+        self.created = self.reused = self.discarded = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_idle=settings.EMAIL_POOL_MAX_IDLE,
+            idle_timeout=settings.EMAIL_POOL_IDLE_TIMEOUT,
+            noop_after=settings.EMAIL_POOL_NOOP_AFTER,
+            max_messages=settings.EMAIL_POOL_MAX_MESSAGES,
+        )
+
+    def acquire(self, key, connect):
+        """Return an idle healthy connection for `key`, or a new one from `connect()`."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                break
+            idle_for = time.monotonic() - pooled.last_used
+            if idle_for > self.idle_timeout or (idle_for > self.noop_after and not self.healthy(pooled)):
+                self.discard(pooled)
+                continue
+            with self._lock:
+                self.reused += 1
+            return pooled
+        pooled = PooledConnection(key, connect())
+        with self._lock:
+            self.created += 1
+        return pooled
+
+    def release(self, pooled):
+        if pooled.sent >= self.max_messages:
+            self.discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle[pooled.key]
+            if len(idle) < self.max_idle:
+                idle.append(pooled)
+                return
+        self.discard(pooled)
+
+    def discard(self, pooled):
+        with self._lock:
+            self.discarded += 1
+        try:
+            pooled.connection.quit()
+        except (smtplib.SMTPException, OSError):
+            pooled.connection.close()
+
+    @staticmethod
+    def healthy(pooled):
+        try:
+            return pooled.connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def clear(self):
+        with self._lock:
+            idle = [pooled for connections in self._idle.values() for pooled in connections]
+            self._idle.clear()
+        for pooled in idle:
+            self.discard(pooled)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'idle': sum(len(connections) for connections in self._idle.values()),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+            }
+
+
+smtp_pool = SMTPPool.from_settings()
+
+
+class PooledSMTPEmailBackend(smtp.EmailBackend):
+    """
+    Drop-in replacement for Django's SMTP backend using `smtp_pool`.
+
+    `open()` borrows a connection and `close()` returns it, so both
+    `send_mail()` and explicitly opened connections (e.g. the outbox sending a
+    batch) reuse sessions. A borrowed connection the server dropped is
+    replaced once before the send is reported as failed.
+    """
+
+    def __init__(self, *args, pool=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = pool or smtp_pool
+        self.pooled = None
+
+    @property
+    def pool_key(self):
+        return (self.connection_class, self.host, self.port, self.username, self.password,
+                self.use_tls, self.use_ssl, self.ssl_keyfile, self.ssl_certfile)
+
+    def connect(self):
+        fail_silently, self.fail_silently = self.fail_silently, False
+        try:
+            super().open()
+        finally:
+            self.fail_silently = fail_silently
+        connection, self.connection = self.connection, None
+        return connection
+
+    def open(self):
+        if self.connection:
+            return False
+        try:
+            self.pooled = self.pool.acquire(self.pool_key, self.connect)
+        except (smtplib.SMTPException, OSError):
+            if not self.fail_silently:
+                raise
+            return None
+        self.connection = self.pooled.connection
+        return True
+
+    def close(self):
+        if self.pooled is None:
+            return
+        pooled, self.pooled, self.connection = self.pooled, None, None
+        self.pool.release(pooled)
+
+    def drop(self):
+        """Discard the borrowed connection; the next `open()` gets another."""
+        pooled, self.pooled, self.connection = self.pooled, None, None
+        self.pool.discard(pooled)
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        with self._lock:
+            new_conn_created = self.open()
+            if not self.connection or new_conn_created is None:
+                return 0
+            num_sent = 0
+            try:
+                for message in email_messages:
+                    if self._send(message):
+                        num_sent += 1
+            finally:
+                if new_conn_created:
+                    self.close()
+        return num_sent
+
+    def _send(self, email_message):
+        if not email_message.recipients():
+            return False
+        if self.pooled is not None and self.pooled.sent >= self.pool.max_messages:
+            self.drop()
+        if self.pooled is None and not self.open():
+            return False
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(email_message.from_email, encoding)
+        recipients = [sanitize_address(addr, encoding) for addr in email_message.recipients()]
+        message = email_message.message().as_bytes(linesep='\r\n')
+        try:
+            try:
+                self.connection.sendmail(from_email, recipients, message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Most likely a pooled session the server timed out.
+                self.drop()
+                if not self.open():
+                    return False
+                self.connection.sendmail(from_email, recipients, message)
+        except (smtplib.SMTPException, OSError) as e:
+            # Refusals leave the session usable (smtplib sends RSET); anything
+            # else may have left it mid-transaction, so don't pool it again.
+            if self.pooled is not None and not isinstance(
+                    e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                self.drop()
+            if not self.fail_silently:
+                raise
+            return False
+        self.pooled.sent += 1
+        return True
@@ -0,0 +1,203 @@
+"""
+A small database-backed task queue.
+
+Functions decorated with `@task` can be queued with `enqueue(func, ...)` from
+a request and are run by `manage.py runworker`, which claims due rows from the
+`home.Task` table. On Postgres rows are claimed with SELECT ... FOR UPDATE
+SKIP LOCKED; other databases fall back to a conditional UPDATE per row.
+Failed tasks are retried with exponential backoff until `max_attempts`.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from home.models import Task
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(func=None, queue='default', max_attempts=None):
+    """Register `func` as a task; use as `@task` or `@task(queue=...)`."""
+    def register(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.task_queue = queue
+        func.task_max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+        TASKS[func.task_name] = func
+        return func
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    if name not in TASKS:
+        # Importing the defining module registers the task.
+        import_module(name.rsplit('.', 1)[0])
+    return TASKS[name]
+
+
+def enqueue(func, *args, queue=None, delay=0, **kwargs):
+    """
+    Queue a call of the task `func` and return the Task row.
+
+    The row is written in the caller's transaction, so the work only becomes
+    visible to workers once the request's changes are committed.
+    """
+    return Task.objects.create(
+        queue=queue or func.task_queue,
+        name=func.task_name,
+        payload=json.dumps({'args': args, 'kwargs': kwargs}),
+        max_attempts=func.task_max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    return min(settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1), settings.TASK_RETRY_BACKOFF_MAX)
+
+
+def claimable(queue, now):
+    """Due queued tasks, plus running ones whose worker has gone quiet."""
+    stale = now - timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT)
+    return Task.objects.filter(queue=queue).filter(
+        Q(status=Task.QUEUED, run_at__lte=now) | Q(status=Task.RUNNING, locked_at__lt=stale)
+    ).order_by('run_at', 'id')
+
+
+def claim_rows(queryset, limit, guard, **changes):
+    """
+    Apply `changes` to up to `limit` rows of `queryset` that no one else has
+    claimed meanwhile, and return those rows with the changes set on them.
+
+    Without SKIP LOCKED, several workers may pick the same candidates; the
+    UPDATE is then made conditional on the `guard` fields being unchanged, so
+    exactly one of them wins each row.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            rows = list(queryset.select_for_update(skip_locked=True)[:limit])
+            queryset.model.objects.filter(id__in=[row.id for row in rows]).update(**changes)
+    else:
+        rows = []
+        for candidate in queryset[:limit * 4]:
+            won = queryset.model.objects.filter(
+                id=candidate.id, **{field: getattr(candidate, field) for field in guard}
+            ).update(**changes)
+            if won:
+                rows.append(candidate)
+            if len(rows) == limit:
+                break
+    for row in rows:
+        for field, value in changes.items():
+            setattr(row, field, value)
+    return rows
+
+
+def claim(queue, worker_id, limit=1):
+    """Atomically mark up to `limit` due tasks of `queue` as running and return them."""
+    now = timezone.now()
+    return claim_rows(
+        claimable(queue, now), limit, guard=('status', 'locked_at'),
+        status=Task.RUNNING, locked_by=worker_id, locked_at=now, updated_at=now,
+    )
+
+
+def execute(t):
+    """Run one claimed task and record the outcome; returns True on success."""
+    t.attempts += 1
+    try:
+        payload = json.loads(t.payload)
+        get_task(t.name)(*payload.get('args', ()), **payload.get('kwargs', {}))
+    except Exception:
+        t.last_error = traceback.format_exc()
+        if t.attempts < t.max_attempts:
+            t.status = Task.QUEUED
+            t.run_at = timezone.now() + timedelta(seconds=retry_delay(t.attempts))
+        else:
+            t.status = Task.FAILED
+        logger.warning('Task %s (%s) failed, attempt %s/%s', t.id, t.name, t.attempts, t.max_attempts)
+        succeeded = False
+    else:
+        t.status = Task.DONE
+        t.last_error = ''
+        succeeded = True
+    t.locked_by = ''
+    t.locked_at = None
+    t.save(update_fields=['status', 'attempts', 'run_at', 'last_error', 'locked_by', 'locked_at', 'updated_at'])
+    return succeeded
+
+
+class Worker:
+    """
+    Runs `concurrency` threads per queue, each claiming and executing one
+    task at a time and sleeping `poll_interval` seconds when idle.
+    """
+
+    def __init__(self, queues, poll_interval=1.0, burst=False):
+        self.queues = queues
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stopping = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+        self.id_prefix = f'{socket.gethostname()}:{os.getpid()}'
+
+    def run_queue(self, queue, worker_id):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    tasks = claim(queue, worker_id)
+                except DatabaseError:
+                    # e.g. a lock timeout; the rows are still there next time.
+                    logger.exception('Claiming from queue %s failed', queue)
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                if not tasks:
+                    if self.burst:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                for t in tasks:
+                    try:
+                        execute(t)
+                    except DatabaseError:
+                        # The outcome wasn't saved; the task stays running
+                        # until TASK_VISIBILITY_TIMEOUT and is then retried.
+                        logger.exception('Saving the result of task %s failed', t.id)
+                    with self._lock:
+                        self.processed += 1
+        finally:
+            connection.close()
+
+    def run(self):
+        threads = []
+        for queue, concurrency in self.queues.items():
+            for n in range(concurrency):
+                worker_id = f'{self.id_prefix}:{queue}:{n}'
+                thread = threading.Thread(target=self.run_queue, args=(queue, worker_id), name=worker_id)
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+        return self.processed
+
+    def stop(self):
+        self.stopping.set()
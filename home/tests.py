@@ -1,3 +1,674 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import get_connection, send_mail
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.models import App
+from home import importtime, metrics
+from home.benchmarks import LocalSMTPServer, make_modules
+from home.db.backends.sqlite3.base import DatabaseWrapper
+from home.db import slow_queries
+from home.db.pool import ConnectionPool, PoolTimeout, clear_pools, pool_stats
+from home.mail import deliver_outbox, outbox_stats
+from home.models import OutboxMessage, Task
+from home.smtp import SMTPPool
+from home.tasks import claim, enqueue, execute, retry_delay, task
+from modules import manifest
+from subscriptions.models import Plan, Subscription
+from users.models import User
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_serializers_benchmark(self):
+        out = StringIO()
+        call_command('benchmark', 'serializers', rows=[20], repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('case'))
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line.endswith('True') for line in lines[1:]))
+
+    def test_renderers_benchmark(self):
+        out = StringIO()
+        call_command('benchmark', 'renderers', rows=[5], repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('payload'))
+        self.assertGreaterEqual(len(lines), 3)
+
+    def test_startup_benchmark(self):
+        out = StringIO()
+        call_command('benchmark', 'startup', rows=[0, 3], repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertTrue(all(line.endswith('True') for line in lines[1:]))
+
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     pkg.inner
+import time:        50 |         50 |     other
+import time:        20 |        170 |   pkg.outer
+import time:        10 |        180 | pkg
+import time:        40 |         40 |   pkg.late
+import time:         5 |         45 | app
+"""
+
+
+class ImportProfileTests(TestCase):
+
+    def test_costs(self):
+        imports = importtime.parse_importtime(IMPORTTIME + 'RuntimeWarning: unrelated\n')
+        self.assertEqual(imports[2], importtime.Import('pkg.outer', 1, 20, 170))
+        self.assertEqual(importtime.total_us(imports), 225)
+        costs = importtime.costs_by_prefix(imports, ['pkg', 'pkg.outer', 'other', 'app'])
+        self.assertEqual(costs['pkg'], importtime.Cost(170, 220, 4))
+        self.assertEqual(costs['pkg.outer'], importtime.Cost(20, 170, 1))
+        self.assertEqual(costs['other'], importtime.Cost(50, 50, 1))
+        self.assertEqual(costs['app'], importtime.Cost(5, 45, 1))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('import_profile', profile='api', limit=0, stdout=out)
+        output = out.getvalue()
+        self.assertTrue(output.startswith('app '))
+        self.assertIn('urlconf', output)
+        self.assertIn('home.apps.HomeConfig', output)
+        self.assertNotIn('drf_yasg', output)
+        self.assertRegex(output, r'\d+ modules imported in [\d.]+ms, max RSS [\d.]+MB, \d+ installed apps')
+
+
+class ProjectReportTests(TestCase):
+
+    def report(self, **options):
+        out = StringIO()
+        call_command('generate_project_report', stdout=out, **options)
+        report = json.loads(out.getvalue())
+        urls = {}
+        for entry in report['urls']:
+            # The first of each name; format-suffix variants follow it.
+            urls.setdefault(entry['name'], entry)
+        return report, urls
+
+    def test_inventory(self):
+        report, urls = self.report()
+        self.assertIn('App', report['models'])
+        self.assertEqual(urls['apps-list'], {
+            'url': '/api/v1/apps/', 'module': 'home.api.v1.viewsets.AppViewSet', 'name': 'apps-list',
+            'decorators': '',
+        })
+        self.assertEqual(urls['users:detail']['url'], '/users/<str:username>/')
+
+    def test_matches_show_urls(self):
+        out = StringIO()
+        call_command('show_urls', format='json', stdout=out)
+        report, _ = self.report()
+        self.assertEqual(report['urls'], json.loads(out.getvalue()))
+
+    def test_details(self):
+        _, urls = self.report(details=True)
+        self.assertEqual(urls['apps-export']['view_class'], 'home.api.v1.viewsets.AppViewSet')
+        self.assertEqual(urls['apps-export']['permission_classes'], ['rest_framework.permissions.IsAuthenticated'])
+        self.assertEqual(urls['apps-export']['methods'], ['GET', 'HEAD', 'OPTIONS'])
+        self.assertEqual(urls['apps-detail']['methods'], ['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PATCH', 'PUT'])
+        self.assertEqual(urls['signup-list']['methods'], ['POST'])
+        self.assertIsNone(urls['home']['view_class'])
+
+    def test_probe(self):
+        user = User.objects.create(username='prober', email='prober@test.com')
+        _, urls = self.report(probe=2, probe_user='prober@test.com')
+        probe = urls['apps-list']['probe']
+        self.assertEqual(probe['status'], 200)
+        self.assertGreater(probe['queries'], 0)
+        self.assertGreaterEqual(probe['median_ms'], 0)
+        self.assertEqual(urls['api-root']['probe']['status'], 200)
+        self.assertNotIn('probe', urls['apps-detail'])
+        self.assertNotIn('probe', urls['login-list'])
+
+        user.delete()
+        with self.assertRaises(CommandError):
+            self.report(probe=1, probe_user='prober')
+
+
+class ModuleManifestTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.modules_dir = Path(root.name) / 'modules'
+        self.path = Path(root.name) / 'manifest.json'
+        make_modules(self.modules_dir, 2)
+        (self.modules_dir / 'module_1' / 'urls.py').unlink()
+
+    def test_scan(self):
+        self.assertEqual(manifest.scan_modules(self.modules_dir), {
+            'version': manifest.MANIFEST_VERSION,
+            'apps': ['modules', 'modules.module_0', 'modules.module_1'],
+            'urls': ['module_0'],
+            'admins': ['module_0', 'module_1'],
+        })
+
+    def test_load_built_manifest(self):
+        built = manifest.build_manifest(self.path, self.modules_dir)
+        make_modules(self.modules_dir, 3)
+        with mock.patch('modules.manifest.scan_modules') as scan:
+            self.assertEqual(manifest.load_manifest(self.path, self.modules_dir), built)
+        scan.assert_not_called()
+
+    def test_scan_without_manifest(self):
+        with self.assertRaises(ImproperlyConfigured):
+            manifest.load_manifest(self.path, self.modules_dir)
+        scanned = manifest.load_manifest(self.path, self.modules_dir, scan=True)
+        self.assertEqual(scanned, manifest.scan_modules(self.modules_dir))
+
+        self.path.write_text(json.dumps({'version': 0, 'apps': []}))
+        with self.assertRaises(ImproperlyConfigured):
+            manifest.load_manifest(self.path, self.modules_dir)
+        self.assertEqual(manifest.load_manifest(self.path, self.modules_dir, scan=True), scanned)
+
+    def test_command(self):
+        with mock.patch.multiple(manifest, MANIFEST_PATH=self.path, MODULES_DIR=self.modules_dir):
+            with self.assertRaises(CommandError):
+                call_command('build_module_manifest', check=True, stdout=StringIO())
+            out = StringIO()
+            call_command('build_module_manifest', stdout=out)
+            self.assertIn('3 app(s), 1 url module(s), 2 admin module(s)', out.getvalue())
+            call_command('build_module_manifest', check=True, stdout=StringIO())
+
+            make_modules(self.modules_dir, 3)
+            with self.assertRaises(CommandError):
+                call_command('build_module_manifest', check=True, stdout=StringIO())
+
+
+CALLS = []
+
+
+@task
+def record(value):
+    CALLS.append(value)
+
+
+@task(queue='flaky', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue_and_execute(self):
+        enqueue(record, 'a')
+        [claimed] = claim('default', 'w1')
+        self.assertEqual(claimed.status, Task.RUNNING)
+        self.assertEqual(claim('default', 'w2'), [])
+        self.assertTrue(execute(claimed))
+        self.assertEqual(CALLS, ['a'])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_delayed_task_is_not_claimed_early(self):
+        enqueue(record, 'later', delay=60)
+        self.assertEqual(claim('default', 'w1'), [])
+
+    @override_settings(TASK_RETRY_BACKOFF=10, TASK_RETRY_BACKOFF_MAX=15)
+    def test_retry_with_backoff_then_fail(self):
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)], [10, 15, 15])
+        enqueue(explode)
+        [claimed] = claim('flaky', 'w1')
+        before = timezone.now()
+        self.assertFalse(execute(claimed))
+        t = Task.objects.get()
+        self.assertEqual((t.status, t.attempts), (Task.QUEUED, 1))
+        self.assertGreaterEqual(t.run_at, before + timedelta(seconds=10))
+        self.assertIn('RuntimeError: boom', t.last_error)
+
+        Task.objects.update(run_at=timezone.now())
+        [claimed] = claim('flaky', 'w1')
+        execute(claimed)
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts), (Task.FAILED, 2))
+
+    @override_settings(TASK_VISIBILITY_TIMEOUT=60)
+    def test_stale_running_task_is_reclaimed(self):
+        enqueue(record, 'a')
+        claim('default', 'lost-worker')
+        self.assertEqual(claim('default', 'w2'), [])
+        Task.objects.update(locked_at=timezone.now() - timedelta(seconds=120))
+        [claimed] = claim('default', 'w2')
+        self.assertEqual(Task.objects.get().locked_by, 'w2')
+
+    def test_claim_with_and_without_skip_locked(self):
+        enqueue(record, 'a')
+        enqueue(record, 'b')
+        skip_locked = not connection.features.has_select_for_update_skip_locked
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', skip_locked):
+            first = claim('default', 'w1')
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', not skip_locked):
+            second = claim('default', 'w2', limit=5)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first[0].id, second[0].id)
+
+
+class RunWorkerCommandTests(TransactionTestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_burst_drains_queues(self):
+        for value in range(3):
+            enqueue(record, value)
+        enqueue(explode)
+        out = StringIO()
+        call_command('runworker', queues=['default:2', 'flaky'], burst=True, poll_interval=0, stdout=out)
+        self.assertIn('Processed 4 task(s)', out.getvalue())
+        self.assertEqual(sorted(CALLS), [0, 1, 2])
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 3)
+        self.assertEqual(Task.objects.get(queue='flaky').status, Task.QUEUED)
+
+    def test_invalid_queue(self):
+        with self.assertRaises(CommandError):
+            call_command('runworker', queues=['default:x'], burst=True)
+
+
+@override_settings(
+    EMAIL_BACKEND='home.mail.OutboxEmailBackend',
+    OUTBOX_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_BATCH_SIZE=2,
+    OUTBOX_MAX_ATTEMPTS=2,
+)
+class OutboxTests(TestCase):
+
+    def test_signup_mail_is_queued_not_sent(self):
+        response = self.client.post(
+            reverse('rest_register'), {'email': 'outbox@test.com', 'password': 'Pass-w0rd-1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        message = OutboxMessage.objects.get()
+        self.assertEqual(json.loads(message.to), ['outbox@test.com'])
+        self.assertEqual(Task.objects.get().name, deliver_outbox.task_name)
+
+        [claimed] = claim('default', 'w1')
+        self.assertTrue(execute(claimed))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['outbox@test.com'])
+        self.assertEqual(mail.outbox[0].subject, message.subject)
+        self.assertEqual(OutboxMessage.objects.get().status, OutboxMessage.SENT)
+
+    def test_delivery_in_batches_with_html(self):
+        for n in range(5):
+            send_mail(f'Hello {n}', 'text', 'from@test.com', [f'to{n}@test.com'], html_message='<p>html</p>')
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(deliver_outbox(), 5)
+        self.assertEqual(sorted(m.subject for m in mail.outbox), [f'Hello {n}' for n in range(5)])
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>html</p>', 'text/html')])
+        stats = outbox_stats()
+        self.assertEqual((stats['sent'], stats['queued'], stats['failed']), (5, 0, 0))
+        self.assertIsNotNone(stats['latency_p95'])
+
+    def test_failed_delivery_is_retried_then_marked_failed(self):
+        send_mail('Hello', 'text', 'from@test.com', ['to@test.com'])
+        Task.objects.all().delete()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionError('refused')):
+            self.assertEqual(deliver_outbox(), 0)
+            message = OutboxMessage.objects.get()
+            self.assertEqual((message.status, message.attempts), (OutboxMessage.QUEUED, 1))
+            self.assertIn('refused', message.last_error)
+            # A follow-up run is scheduled for the retry.
+            self.assertGreaterEqual(Task.objects.get().run_at, message.send_after)
+
+            OutboxMessage.objects.update(send_after=timezone.now())
+            deliver_outbox()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.FAILED, 2))
+        self.assertEqual(mail.outbox, [])
+
+        out = StringIO()
+        call_command('outbox_stats', stdout=out)
+        self.assertIn('failed       1', out.getvalue())
+
+
+class PooledSMTPBackendTests(TestCase):
+
+    def setUp(self):
+        self.server = LocalSMTPServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def send(self, pool, count=1, **kwargs):
+        for n in range(count):
+            connection = get_connection(
+                'home.smtp.PooledSMTPEmailBackend', pool=pool, host='127.0.0.1', port=self.server.port,
+                username='', password='', use_tls=False, use_ssl=False, **kwargs)
+            send_mail(f'Message {n}', 'Body', 'from@test.com', ['to@test.com'], connection=connection)
+
+    def test_connections_are_reused(self):
+        pool = SMTPPool()
+        self.send(pool, 5)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(pool.stats(), {'idle': 1, 'created': 1, 'reused': 4, 'discarded': 0})
+        pool.clear()
+
+    def test_connections_are_recycled_after_max_messages(self):
+        pool = SMTPPool(max_messages=2)
+        self.send(pool, 5)
+        self.assertEqual(self.server.connections, 3)
+        self.assertEqual(len(self.server.messages), 5)
+        pool.clear()
+
+    def test_idle_connection_is_health_checked(self):
+        pool = SMTPPool(noop_after=0)
+        self.send(pool)
+        self.server.drop_connections()
+        self.send(pool)
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(len(self.server.messages), 2)
+        pool.clear()
+
+    def test_dropped_connection_is_replaced_once(self):
+        pool = SMTPPool()
+        self.send(pool)
+        self.server.drop_connections()
+        self.send(pool)
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.server.messages), 2)
+        pool.clear()
+
+    def test_smtp_benchmark(self):
+        out = StringIO()
+        call_command('benchmark', 'smtp', rows=[3], repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].startswith('PooledSMTPEmailBackend'))
+
+
+class ConnectionPoolTests(TestCase):
+
+    def connect(self):
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+    @staticmethod
+    def healthy(connection):
+        try:
+            connection.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    def test_reuse_and_bound(self):
+        pool = ConnectionPool(max_size=2, timeout=0.05)
+        first = pool.acquire(self.connect, self.healthy)
+        second = pool.acquire(self.connect, self.healthy)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect, self.healthy)
+        pool.release(first, lambda c: c.rollback())
+        self.assertIs(pool.acquire(self.connect, self.healthy), first)
+        self.assertEqual(pool.stats(), dict(pool.stats(), in_use=2, idle=0, created=2, reused=1, waits=1,
+                                            timeouts=1))
+        pool.discard(second)
+        pool.discard(first)
+
+    def test_waiting_thread_gets_released_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        pooled = pool.acquire(self.connect, self.healthy)
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(pool.acquire(self.connect, self.healthy)))
+        thread.start()
+        time.sleep(0.05)
+        pool.release(pooled, lambda c: c.rollback())
+        thread.join()
+        self.assertEqual(acquired, [pooled])
+        self.assertEqual(pool.stats()['waits'], 1)
+        pool.discard(pooled)
+
+    def test_health_check_and_max_lifetime(self):
+        pool = ConnectionPool(max_size=2, check_after=0)
+        pooled = pool.acquire(self.connect, self.healthy)
+        pool.release(pooled, lambda c: c.rollback())
+        pooled.connection.close()
+        replacement = pool.acquire(self.connect, self.healthy)
+        self.assertIsNot(replacement, pooled)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+
+        pool.max_lifetime = 0
+        pool.release(replacement, lambda c: c.rollback())
+        self.assertEqual(pool.stats(), dict(pool.stats(), in_use=0, idle=0, recycled=1, discarded=2))
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0)
+        with self.assertRaises(sqlite3.Error):
+            pool.acquire(mock.Mock(side_effect=sqlite3.OperationalError), self.healthy)
+        pool.discard(pool.acquire(self.connect, self.healthy))
+
+
+class PooledBackendTests(TestCase):
+
+    def setUp(self):
+        handle, name = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, name)
+        settings_dict = dict(connection.settings_dict, ENGINE='home.db.backends.sqlite3', NAME=name)
+        self.wrapper = DatabaseWrapper(settings_dict, alias='pooled')
+        self.addCleanup(clear_pools)
+        self.addCleanup(self.wrapper.close)
+
+    def test_close_checks_in(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        self.wrapper.close()
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIs(self.wrapper.connection, raw)
+        stats = pool_stats()['pooled']
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use']), (1, 1, 1))
+
+    def test_close_in_transaction_discards(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        with mock.patch.object(self.wrapper, 'in_atomic_block', True):
+            self.wrapper.close()
+        stats = pool_stats()['pooled']
+        self.assertEqual((stats['discarded'], stats['in_use'], stats['idle']), (1, 0, 0))
+        with self.assertRaises(sqlite3.ProgrammingError):
+            raw.execute('SELECT 1')
+
+    def test_stats_endpoint(self):
+        staff = User.objects.create(username='staff', email='staff@test.com', is_staff=True)
+        self.wrapper.ensure_connection()
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create(username='user', email='user@test.com'))
+        self.assertEqual(client.get('/api/v1/db-pool/').status_code, 403)
+        client.force_authenticate(user=staff)
+        response = client.get('/api/v1/db-pool/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pooled']['in_use'], 1)
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.user = User.objects.create(username='metered', email='metered@test.com')
+        App.objects.create(name='Metered', description='Metered', type='ty1', framework='fw1', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def sample(self, exposition, line):
+        match = re.search(rf'^{re.escape(line)} (\S+)$', exposition, re.M)
+        self.assertIsNotNone(match, line)
+        return float(match.group(1))
+
+    def server_timing(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {name: float(dur) for name, dur in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])}
+
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_server_timing(self):
+        timing = self.server_timing(reverse('apps-list'))
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'total'})
+        self.assertGreater(timing['serialize'], 0)
+        self.assertGreater(timing['render'], 0)
+        self.assertGreaterEqual(timing['total'], timing['db'] + timing['serialize'] + timing['render'])
+        # Model serializers, including nested ones, count once.
+        app = App.objects.get()
+        plan = Plan.objects.create(name='Metered', description='Metered', price=1)
+        subscription = Subscription.objects.create(user=self.user, app=app, plan=plan)
+        timing = self.server_timing(
+            reverse('subscriptions-detail', kwargs={'pk': subscription.pk}) + '?expand=plan,app')
+        self.assertGreater(timing['serialize'], 0)
+        self.assertGreaterEqual(timing['total'], timing['db'] + timing['serialize'] + timing['render'])
+        self.assertFalse(self.client.get(reverse('metrics')).has_header('Server-Timing'))
+
+    @override_settings(DEBUG=False, METRICS_SERVER_TIMING=False)
+    def test_server_timing_off(self):
+        self.assertFalse(self.client.get(reverse('apps-list')).has_header('Server-Timing'))
+
+    def test_metrics_endpoint(self):
+        for _ in range(2):
+            self.client.get(reverse('apps-list'))
+        self.client.get('/api/v1/nothing-here/')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertEqual(self.sample(
+            text, 'http_request_duration_seconds_count{view="apps-list",method="GET",status="200"}'), 2)
+        self.assertEqual(self.sample(
+            text, 'http_request_duration_seconds_bucket{view="apps-list",method="GET",status="200",le="+Inf"}'), 2)
+        self.assertGreater(self.sample(text, 'http_request_db_queries_sum{view="apps-list",method="GET"}'), 0)
+        self.assertGreater(
+            self.sample(text, 'http_request_serialize_duration_seconds_sum{view="apps-list",method="GET"}'), 0)
+        self.assertEqual(self.sample(
+            text, 'http_request_duration_seconds_count{view="<unresolved>",method="GET",status="404"}'), 1)
+        self.assertNotIn('view="metrics"', text)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_processes_are_merged(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('apps-list'))
+            snapshot = metrics.registry.snapshot()
+            snapshot['collected'] = [['workers', 'gauge', 'Workers.', [[[['state', 'busy']], 1]]]]
+            for pid in (os.getppid(), 2 ** 22 + 1):  # alive, exited
+                with open(os.path.join(directory, f'{pid}.json'), 'w') as f:
+                    json.dump(dict(snapshot, pid=pid), f)
+            text = metrics.registry.exposition()
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+        self.assertEqual(self.sample(
+            text, 'http_request_duration_seconds_count{view="apps-list",method="GET",status="200"}'), 3)
+        self.assertEqual(self.sample(text, 'workers{state="busy"}'), 1)
+        self.assertIn('# TYPE db_pool_connections gauge', text)
+
+
+class SlowQueryLogTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        slow_queries._explained.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.log = os.path.join(directory, 'slow.log')
+        self.user = User.objects.create(username='slow', email='slow@test.com')
+        self.plan = Plan.objects.create(name='Slow', description='Slow', price=1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def delete_app(self, name):
+        app = App.objects.create(name=name, description=name, type='ty1', framework='fw1', user=self.user)
+        Subscription.objects.create(user=self.user, app=app, plan=self.plan)
+        response = self.client.delete(reverse('apps-detail', args=[app.pk]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_normalize(self):
+        self.assertEqual(
+            slow_queries.normalize("SELECT  *\n FROM t1 WHERE a = 'it''s' AND b IN (%s, %s, %s) AND c > 2.5"),
+            'SELECT * FROM t1 WHERE a = ? AND b IN (...) AND c > ?')
+        self.assertEqual(slow_queries.normalize('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+                         'INSERT INTO t (a, b) VALUES (...)')
+        self.assertEqual(slow_queries.fingerprint(slow_queries.normalize('SELECT 1 FROM t WHERE id IN (1, 2)')),
+                         slow_queries.fingerprint(slow_queries.normalize('SELECT 7 FROM t WHERE id IN (3)')))
+
+    def test_slow_statements_are_logged_with_view_and_plan(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6, SLOW_QUERY_LOG=self.log):
+            self.delete_app('First')
+            self.delete_app('Second')
+        self.assertIsNone(slow_queries.current_view())
+
+        updates = [e for e in slow_queries.read_log(self.log)
+                   if e['sql'].startswith('UPDATE "subscriptions_subscription"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual({e['view'] for e in updates}, {'apps-detail'})
+        self.assertEqual(updates[0]['fingerprint'], updates[1]['fingerprint'])
+        self.assertIn('U0."user_id" = ?', updates[0]['sql'])
+        # The user/app filter is served by the index of the UserAppPlan constraint.
+        self.assertIn('USING COVERING INDEX sqlite_autoindex_subscriptions_subscription_1', updates[0]['explain'])
+        # Explained once per interval.
+        self.assertIsNone(updates[1]['explain'])
+
+    def test_explained_fingerprints_are_bounded(self):
+        with mock.patch.object(slow_queries, 'EXPLAINED_MAX_SIZE', 2):
+            for key in ('a', 'b', 'c'):
+                self.assertTrue(slow_queries.should_explain(key))
+        self.assertEqual(list(slow_queries._explained), ['b', 'c'])
+        self.assertFalse(slow_queries.should_explain('c'))
+        self.assertTrue(slow_queries.should_explain('a'))
+
+    def test_fast_statements_are_not_logged(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=60000, SLOW_QUERY_LOG=self.log):
+            self.delete_app('Fast')
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log):
+            self.delete_app('Disabled')
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_slow_queries_command(self):
+        entries = [
+            ('a' * 16, 'SELECT ? FROM a', 10.0, 'apps-list', 'SCAN a'),
+            ('b' * 16, 'SELECT ? FROM b', 30.0, 'subscriptions-list', None),
+            ('a' * 16, 'SELECT ? FROM a', 15.0, None, None),
+        ]
+        with open(self.log, 'w') as f:
+            for key, sql, duration, view, plan in entries:
+                f.write(json.dumps({'fingerprint': key, 'sql': sql, 'duration_ms': duration,
+                                    'view': view, 'explain': plan}) + '\n')
+            f.write('{"truncat')
+        out = StringIO()
+        call_command('slow_queries', '--log', self.log, '--explain', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(), ['fingerprint', 'count', 'total_ms', 'mean_ms', 'max_ms', 'views', 'sql'])
+        self.assertEqual(lines[1].split()[:6], ['b' * 16, '1', '30.0', '30.0', '30.0', 'subscriptions-list'])
+        self.assertEqual(lines[2].split()[:6], ['a' * 16, '2', '25.0', '12.5', '15.0', 'apps-list,-'])
+        self.assertIn('    SCAN a', lines)
+        self.assertIn('    (no plan captured)', lines)
+
+        with self.assertRaises(CommandError):
+            call_command('slow_queries', '--log', self.log + '.missing')
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import home
+from .views import home, metrics
 
 urlpatterns = [
     path("", home, name="home"),
+    path("metrics", metrics, name="metrics"),
 ]
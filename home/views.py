@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from home.metrics import registry
+
 
 def home(request):
     packages = [
@@ -11,3 +17,11 @@ def home(request):
         'packages': packages
     }
     return render(request, 'home/index.html', context)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>` if that is set."""
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
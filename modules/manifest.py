@@ -1,19 +1,95 @@
+"""
+Installed Crowdbotics modules, from a manifest built at deploy time.
+
+Finding modules means walking the `modules/` tree for `apps.py`, `urls.py`
+and `admin.py` files. `manage.py build_module_manifest` does that walk once
+and writes the result to `modules/manifest.json`; settings, `modules.urls`
+and `modules.admin` read that file instead. Without a manifest the tree is
+scanned when `MODULES_SCAN` is set (the default with DEBUG); otherwise a
+missing manifest is an ImproperlyConfigured error.
+"""
+import json
+import os
+import tempfile
 from pathlib import Path
-from django.urls import path, include
+
+from django.core.exceptions import ImproperlyConfigured
 
 MODULES_PACKAGE_NAME = "modules"
-MODULES_DIR = f"{Path.cwd()}/{MODULES_PACKAGE_NAME}/"
-APPS = Path(MODULES_DIR).rglob("apps.py")
+MODULES_DIR = Path(__file__).resolve().parent
+MANIFEST_PATH = MODULES_DIR / "manifest.json"
+MANIFEST_VERSION = 1
+
+_manifest = None
+
 
+def scan_modules(modules_dir=MODULES_DIR):
+    """Walk `modules_dir` once and return the manifest contents."""
+    modules_dir = Path(modules_dir)
+    apps, urls, admins = [], [], []
+    for root, dirs, files in os.walk(modules_dir):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__" and not d.startswith("."))
+        package = Path(root).relative_to(modules_dir.parent).parts
+        if "apps.py" in files:
+            apps.append(".".join(package))
+        # Module urls and admins are addressed by their directory name.
+        if package[-1] != MODULES_PACKAGE_NAME:
+            if "urls.py" in files:
+                urls.append(package[-1])
+            if "admin.py" in files:
+                admins.append(package[-1])
+    return {"version": MANIFEST_VERSION, "apps": apps, "urls": urls, "admins": admins}
 
-def get_modules():
+
+def build_manifest(path=MANIFEST_PATH, modules_dir=MODULES_DIR):
+    manifest = scan_modules(modules_dir)
+    # Replaced in one step, so a process starting meanwhile never reads half of it.
+    fd, tmp = tempfile.mkstemp(dir=Path(path).parent, suffix=".tmp")
     try:
-        modules = []
-        python_package_separator = "."
-        for app in APPS:
-            app_name = app.as_posix().replace(MODULES_DIR, f"{MODULES_PACKAGE_NAME}/")
-            app_name = python_package_separator.join(app_name.split("/")[:-1])
-            modules.append(app_name)
-        return modules
-    except (ImportError, IndexError):
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return manifest
+
+
+def load_manifest(path=MANIFEST_PATH, modules_dir=MODULES_DIR, scan=False):
+    """
+    Return the manifest at `path`. If it is missing or outdated, scan
+    `modules_dir` when `scan` is true and raise ImproperlyConfigured otherwise.
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
         pass
+    if not scan:
+        raise ImproperlyConfigured(
+            f"No up-to-date module manifest at {path}. Run `MODULES_SCAN=1 manage.py "
+            f"build_module_manifest` when building the release, or set MODULES_SCAN=1 "
+            f"to scan {modules_dir} on startup."
+        )
+    return scan_modules(modules_dir)
+
+
+def get_manifest(scan=None):
+    """The manifest of this process, loaded on first use."""
+    global _manifest
+    if _manifest is None:
+        if scan is None:
+            from django.conf import settings
+
+            scan = settings.MODULES_SCAN
+        _manifest = load_manifest(scan=scan)
+    return _manifest
+
+
+def get_modules(scan=False):
+    """App labels of the installed modules, for INSTALLED_APPS."""
+    return list(get_manifest(scan)["apps"])
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0003_auto_20211102_1726'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='sub_user_created_id_idx'),
+        ),
+    ]
@@ -29,5 +29,11 @@ class Subscription(models.Model):
             models.UniqueConstraint(fields=['user', 'app'],
                                     name='UserAppPlan'),
         ]
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='sub_user_created_id_idx'),
+            models.Index(fields=['user', 'active'], name='sub_user_active_idx'),
+            models.Index(fields=['user', 'plan'], name='sub_user_plan_idx'),
+        ]
+
     def __str__(self):
         return self.user.username